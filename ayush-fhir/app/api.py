@@ -1,36 +1,78 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Header, Depends
 from typing import Any, List
-from .ingest import ingest_csv_file
-from .fhir import build_codesystem, build_conceptmap
+from .ingest import DEFAULT_DATASET_PATH, ingest_csv_file
+from .fhir import (
+    build_codesystem_bytes, build_conceptmap_bytes, build_codesystem_stream, build_conceptmap_stream
+)
 from .storage import terminology_store
 from .who_api import who_client
+from .audit import audit_writer, provenance_writer
 from .snomed_loinc import snomed_service, loinc_service, get_semantic_coding
 from .fhir_resources import (
     create_problem_list_entry, create_encounter, create_patient, 
-    create_practitioner, create_consent, create_audit_event, create_provenance
+    create_practitioner, create_consent, create_audit_event, create_provenance, iso_now
 )
 from .iso_22600 import check_resource_access, load_consent_from_fhir, access_control
 from datetime import datetime
+import asyncio
+import time
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pathlib import Path
+from fastapi.responses import FileResponse, Response, StreamingResponse
 import json
 
 router = APIRouter()
 
+# Created by the app lifespan when it schedules the startup dataset load and set
+# once that load has finished (successfully or not); None means nothing to wait for
+preload_done: asyncio.Event | None = None
+
+
+async def wait_for_preload() -> None:
+    # Routes that read or replace the terminology store hold until the preload is done
+    event = preload_done
+    if event is not None:
+        await event.wait()
+
+
+_needs_store = [Depends(wait_for_preload)]
+
+# WHO entity titles used to enrich /translate, refreshed at most once per TTL
+WHO_TITLES_TTL = 3600.0
+_who_titles: dict[str, Any] = {}
+_who_titles_fetched: float | None = None
+_who_titles_lock = asyncio.Lock()
 
-def _ensure_loaded() -> None:
-    # Auto-load default dataset if store is empty
-    if len(terminology_store.namaste) == 0:
-        data_path = Path(__file__).resolve().parents[1] / 'data' / 'namaste_200.csv'
-        if data_path.exists():
-            try:
-                ingest_csv_file(data_path.read_bytes())
-            except Exception:
-                pass
+# Basic demo title map (would come from WHO API/cache in production)
+TITLE_MAP = {
+    'TM2-AY134': 'Acid dyspepsia (TM2)',
+    'K29.7': 'Gastritis, unspecified',
+    '5A11': 'Type 2 diabetes mellitus',
+    'TM2-AY999': 'Vata imbalance (TM2)'
+}
 
 
-@router.post('/ingest-csv')
+async def _get_who_titles() -> dict[str, Any]:
+    global _who_titles, _who_titles_fetched
+
+    def fresh() -> bool:
+        return _who_titles_fetched is not None and time.monotonic() - _who_titles_fetched < WHO_TITLES_TTL
+
+    if fresh():
+        return _who_titles
+    async with _who_titles_lock:
+        if not fresh():
+            tm2, bio = await asyncio.gather(
+                who_client.get_tm2_entities(),
+                who_client.get_biomedicine_entities(),
+            )
+            titles = {e['id']: e.get('title') for e in tm2}
+            titles.update({e['id']: e.get('title') for e in bio})
+            _who_titles = titles
+            _who_titles_fetched = time.monotonic()
+    return _who_titles
+
+
+@router.post('/ingest-csv', dependencies=_needs_store)
 async def ingest_csv(file: UploadFile = File(...)) -> Any:
     if not file.filename.lower().endswith('.csv'):
         raise HTTPException(status_code=400, detail='Only CSV files are supported')
@@ -42,74 +84,60 @@ async def ingest_csv(file: UploadFile = File(...)) -> Any:
     return {'ingested': count}
 
 
-@router.get('/codesystem')
+@router.get('/codesystem', dependencies=_needs_store)
 def get_codesystem() -> Any:
-    _ensure_loaded()
-    return build_codesystem()
+    return Response(content=build_codesystem_bytes(), media_type='application/fhir+json')
 
 
-@router.get('/conceptmap')
+@router.get('/conceptmap', dependencies=_needs_store)
 def get_conceptmap() -> Any:
-    _ensure_loaded()
-    return build_conceptmap()
+    return Response(content=build_conceptmap_bytes(), media_type='application/fhir+json')
+
+
+@router.get('/codesystem/stream', dependencies=_needs_store)
+def stream_codesystem() -> Any:
+    return StreamingResponse(build_codesystem_stream(), media_type='application/x-ndjson')
 
 
-@router.get('/search')
+@router.get('/conceptmap/stream', dependencies=_needs_store)
+def stream_conceptmap() -> Any:
+    return StreamingResponse(build_conceptmap_stream(), media_type='application/x-ndjson')
+
+
+@router.get('/search', dependencies=_needs_store)
 def search_terms(q: str = Query(..., min_length=1)) -> Any:
-    _ensure_loaded()
-    return terminology_store.search(q)
+    results = terminology_store.search(q)
+    return {kind: [row._asdict() for row in rows] for kind, rows in results.items()}
 
 
-@router.get('/translate')
+@router.get('/translate', dependencies=_needs_store)
 async def translate(code: str = Query(...), system: str = Query(..., pattern='^(namaste|icd11)$')) -> Any:
-    _ensure_loaded()
-    raw = terminology_store.translate(code, system)
-    # Normalize, de-duplicate and enrich with titles
-    def norm_icd(c: str) -> str:
-        return c.replace('ICD-11:', '').strip()
-
-    # Basic demo title map (would come from WHO API/cache in production)
-    title_map = {
-        'TM2-AY134': 'Acid dyspepsia (TM2)',
-        'K29.7': 'Gastritis, unspecified',
-        '5A11': 'Type 2 diabetes mellitus',
-        'TM2-AY999': 'Vata imbalance (TM2)'
-    }
-
-    matches = raw.get('matches', [])
     if system == 'namaste':
-        # Return ICD targets with titles
+        # De-duplicate and return ICD targets with titles
+        matches = terminology_store.translate(code, system).get('matches', [])
         seen: set[str] = set()
         targets: list[dict[str, Any]] = []
         for m in matches:
-            code_only = norm_icd(m.get('code', ''))
+            code_only = m.get('code', '')
             if not code_only or code_only in seen:
                 continue
             seen.add(code_only)
             targets.append({
                 'code': code_only,
-                'title': title_map.get(code_only, code_only),
+                'title': TITLE_MAP.get(code_only, code_only),
                 'system': 'ICD-11'
             })
         # Try to enrich using WHO mock data if still missing titles
         if any(t['title'] == t['code'] for t in targets):
-            tm2 = await who_client.get_tm2_entities()
-            bio = await who_client.get_biomedicine_entities()
-            full = {e['id']: e.get('title') for e in tm2}
-            full.update({e['id']: e.get('title') for e in bio})
+            full = await _get_who_titles()
             for t in targets:
                 if t['title'] == t['code'] and t['code'] in full:
                     t['title'] = full[t['code']]
         return { 'targets': targets }
     else:
-        # system == icd11 → return NAMASTE codes with labels
-        seen: set[str] = set()
-        targets: list[dict[str, Any]] = []
-        for m in matches:
-            c = m.get('code')
-            if not c or c in seen:
-                continue
-            seen.add(c)
+        # system == icd11 → return NAMASTE codes with labels straight from the reverse index
+        targets = []
+        for c in terminology_store.namaste_codes_for_icd(code):
             term = terminology_store.namaste.get(c)
             targets.append({
                 'code': c,
@@ -119,9 +147,8 @@ async def translate(code: str = Query(...), system: str = Query(..., pattern='^(
         return { 'targets': targets }
 
 
-@router.get('/suggest')
+@router.get('/suggest', dependencies=_needs_store)
 def suggest(q: str = Query(..., min_length=1)) -> Any:
-    _ensure_loaded()
     return terminology_store.suggest_with_confidence(q)
 
 
@@ -142,22 +169,21 @@ def _require_auth(authorization: str | None) -> None:
 
 
 # --- FHIR Bundle ingest with Audit/Provenance ---
-AUDIT_LOG: list[dict[str, Any]] = []
-PROV_LOG: list[dict[str, Any]] = []
-
-
 @router.post('/ingest-bundle')
 def ingest_bundle(bundle: dict[str, Any], authorization: str | None = Header(default=None)) -> Any:
     _require_auth(authorization)
     if bundle.get('resourceType') != 'Bundle':
         raise HTTPException(status_code=400, detail='Invalid Bundle')
     entries = bundle.get('entry') or []
-    has_condition = any((e.get('resource') or {}).get('resourceType') == 'Condition' for e in entries)
+    # single pass, no placeholder dict per entry
+    has_condition = any(
+        (r := e.get('resource')) and r.get('resourceType') == 'Condition' for e in entries
+    )
     if not has_condition:
         raise HTTPException(status_code=400, detail='Bundle missing Condition resource')
 
-    now = datetime.utcnow().isoformat() + 'Z'
-    AUDIT_LOG.append({
+    now = iso_now()
+    audit_writer.record({
         'resourceType': 'AuditEvent',
         'type': {'code': 'rest'},
         'action': 'C',
@@ -166,7 +192,7 @@ def ingest_bundle(bundle: dict[str, Any], authorization: str | None = Header(def
         'agent': [{'requestor': True}],
         'source': {'site': 'ayush-fhir'},
     })
-    PROV_LOG.append({
+    provenance_writer.record({
         'resourceType': 'Provenance',
         'recorded': now,
         'agent': [{'type': {'text': 'system'}, 'who': {'display': 'ayush-fhir'}}],
@@ -177,16 +203,16 @@ def ingest_bundle(bundle: dict[str, Any], authorization: str | None = Header(def
 
 @router.get('/audit')
 def get_audit() -> Any:
-    return {'entries': AUDIT_LOG}
+    return {'entries': list(audit_writer.entries)}
 
 
 @router.get('/provenance')
 def get_provenance() -> Any:
-    return {'entries': PROV_LOG}
+    return {'entries': list(provenance_writer.entries)}
 
 
 # --- Simple stats for dashboard ---
-@router.get('/stats/top-terms')
+@router.get('/stats/top-terms', dependencies=_needs_store)
 def top_terms() -> Any:
     # frequency based on presence; in real apps, count occurrences. Here, return top 5 by code order
     items = [
@@ -196,18 +222,18 @@ def top_terms() -> Any:
     return {'items': items}
 
 
-@router.get('/stats/dual-coding-rate')
+@router.get('/stats/dual-coding-rate', dependencies=_needs_store)
 def dual_coding_rate() -> Any:
     total = len(terminology_store.namaste)
-    dual = sum(1 for t in terminology_store.namaste.values() if t.icd11_tm2_codes)
+    dual = terminology_store.dual_coded
     rate = (dual / total * 100.0) if total else 0.0
     return {'total_terms': total, 'dual_coded_terms': dual, 'rate_percent': round(rate, 2)}
 
 
-@router.post('/ingest-default')
+@router.post('/ingest-default', dependencies=_needs_store)
 def ingest_default() -> Any:
     # Load the default 200-record CSV from data/namaste_200.csv
-    data_path = Path(__file__).resolve().parents[1] / 'data' / 'namaste_200.csv'
+    data_path = DEFAULT_DATASET_PATH
     if not data_path.exists():
         raise HTTPException(status_code=404, detail='Default dataset not found')
     content = data_path.read_bytes()
@@ -222,19 +248,12 @@ async def search_tm2(
     query: str | None = Query(default=None)
 ) -> Any:
     """Search WHO ICD-11 TM2 entities"""
-    _ensure_loaded()
     term = q or query
     if not term:
         raise HTTPException(status_code=422, detail="Missing ?q= or ?query=")
     
     try:
-        entities = await who_client.get_tm2_entities()
-        # Filter by query
-        filtered = [
-            e for e in entities 
-            if term.lower() in e.get('title', '').lower() or 
-               term.lower() in ' '.join(e.get('synonyms', [])).lower()
-        ]
+        filtered = await who_client.search_tm2_entities(term)
         return {'entities': filtered, 'count': len(filtered)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"WHO API error: {str(e)}")
@@ -243,7 +262,6 @@ async def search_tm2(
 @router.get('/who/biomedicine/search')
 async def search_biomedicine(query: str = Query(..., min_length=1)) -> Any:
     """Search WHO ICD-11 Biomedicine entities"""
-    _ensure_loaded()
     try:
         entities = await who_client.get_biomedicine_entities(query)
         return {'entities': entities, 'count': len(entities)}
@@ -258,7 +276,6 @@ def search_snomed(
     query: str | None = Query(default=None),
 ) -> Any:
     """Search SNOMED CT concepts"""
-    _ensure_loaded()
     term = q or query
     if not term:
         raise HTTPException(status_code=422, detail="Missing ?q= or ?query=")
@@ -277,7 +294,6 @@ def search_loinc(
     query: str | None = Query(default=None),
 ) -> Any:
     """Search LOINC codes"""
-    _ensure_loaded()
     term = q or query
     if not term:
         raise HTTPException(status_code=422, detail="Missing ?q= or ?query=")
@@ -290,7 +306,7 @@ def search_loinc(
         'count': len(codes)
     }
 # --- FHIR Problem List with Dual Coding ---
-@router.post('/fhir/problem-list')
+@router.post('/fhir/problem-list', dependencies=_needs_store)
 def create_problem_list(
     namaste_code: str = Query(...),
     patient_id: str = Query(default="patient-001"),
@@ -299,7 +315,6 @@ def create_problem_list(
     authorization: str | None = Header(default=None)
 ) -> Any:
     """Create FHIR Problem List entry with dual coding"""
-    _ensure_loaded()
     _require_auth(authorization)
     
     # Get ICD-11 codes for the NAMASTE term
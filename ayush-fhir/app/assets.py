@@ -0,0 +1,100 @@
+"""
+Static Asset Cache
+Holds the immutable frontend build in memory with precompressed gzip bodies
+"""
+import gzip
+import hashlib
+import mimetypes
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+from fastapi import Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip, honouring q-values (gzip;q=0 refuses)"""
+    explicit = wildcard = None
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding in ("gzip", "x-gzip"):
+            explicit = q
+        elif coding == "*":
+            wildcard = q
+    q = explicit if explicit is not None else wildcard
+    return q is not None and q > 0
+
+
+class Asset(NamedTuple):
+    body: bytes
+    gzipped: Optional[bytes]
+    etag: str
+    media_type: str
+
+
+class AssetCache:
+    """Serves files from a build directory that was read once at startup"""
+
+    def __init__(self, cache_control: str = "public, max-age=31536000, immutable"):
+        self.cache_control = cache_control
+        self.assets: Dict[str, Asset] = {}
+
+    def load(self, directory: Path) -> int:
+        """Read every file under directory; returns the number of files cached"""
+        assets: Dict[str, Asset] = {}
+        for path in directory.rglob("*"):
+            if not path.is_file():
+                continue
+            body = path.read_bytes()
+            gzipped = gzip.compress(body, 9)
+            assets[path.relative_to(directory).as_posix()] = Asset(
+                body=body,
+                # only worth sending when it actually saves bytes
+                gzipped=gzipped if len(gzipped) < len(body) else None,
+                etag='"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"',
+                media_type=mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+            )
+        self.assets = assets
+        return len(assets)
+
+    def response(self, path: str, request: Request) -> Optional[Response]:
+        """Build the response for a cached file, or None if it is unknown"""
+        asset = self.assets.get(path)
+        if asset is None:
+            return None
+        headers = {"ETag": asset.etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if_none_match = request.headers.get("if-none-match", "")
+        if if_none_match == "*" or asset.etag in (tag.strip() for tag in if_none_match.split(",")):
+            return Response(status_code=304, headers=headers)
+        if asset.gzipped is not None and _accepts_gzip(request.headers.get("accept-encoding", "")):
+            headers["Content-Encoding"] = "gzip"
+            return Response(content=asset.gzipped, media_type=asset.media_type, headers=headers)
+        return Response(content=asset.body, media_type=asset.media_type, headers=headers)
+
+
+class AssetAwareGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that passes the given path prefixes through untouched"""
+
+    def __init__(self, app: ASGIApp, exclude_prefixes: Tuple[str, ...] = (), **options) -> None:
+        super().__init__(app, **options)
+        self.exclude_prefixes = exclude_prefixes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"].startswith(self.exclude_prefixes):
+            # already negotiated (and precompressed) by AssetCache
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+# Global cache for the Vite build output under static/assets
+asset_cache = AssetCache()
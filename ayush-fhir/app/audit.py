@@ -0,0 +1,111 @@
+"""
+Audit Trail Persistence
+Keeps recent AuditEvent/Provenance records in memory and appends them to
+disk as NDJSON in batches from a background task
+"""
+import asyncio
+import logging
+import os
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Optional
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Runtime logs live apart from the input datasets; override with AYUSH_LOG_DIR
+LOG_DIR = Path(os.environ.get("AYUSH_LOG_DIR") or Path(__file__).resolve().parents[1] / "logs")
+
+
+class AuditWriter:
+    """Append-only NDJSON log with an in-memory ring buffer and batched writes"""
+
+    def __init__(
+        self,
+        path: Path,
+        maxlen: int = 10_000,
+        batch_bytes: int = 64 * 1024,
+        flush_interval: float = 0.1
+    ):
+        self.path = path
+        self.batch_bytes = batch_bytes
+        self.flush_interval = flush_interval
+        # Most recent records, served by the read endpoints
+        self.entries: Deque[Dict[str, Any]] = deque(maxlen=maxlen)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Guards _loop/_queue: records enqueue under it, stop() detaches under it
+        self._lock = threading.Lock()
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        """Store a record; it is persisted on the next batch flush"""
+        self.entries.append(entry)
+        line = orjson.dumps(entry) + b"\n"
+        # sync route handlers call this from the threadpool
+        with self._lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._queue.put_nowait, line)
+
+    async def start(self) -> None:
+        """Start the background flush task on the running event loop"""
+        if self._task is not None:
+            return
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(self._queue))
+
+    async def stop(self) -> None:
+        """Flush pending records and stop the background task"""
+        if self._task is None:
+            return
+        # Detach under the lock: every record that got in has already scheduled
+        # its put, so the sentinel is queued behind all of them
+        with self._lock:
+            loop, queue = self._loop, self._queue
+            self._loop = self._queue = None
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+        await self._task
+        self._task = None
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        buffer = bytearray()
+        stopping = False
+        while not stopping:
+            line = await queue.get()
+            if line is None:
+                break
+            buffer += line
+            # Keep batching until the buffer is large enough or the timer runs out
+            deadline = loop.time() + self.flush_interval
+            while len(buffer) < self.batch_bytes:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    line = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if line is None:
+                    stopping = True
+                    break
+                buffer += line
+            try:
+                await asyncio.to_thread(self._append, bytes(buffer))
+            except Exception:
+                # keep draining the queue; the records stay available in self.entries
+                logger.exception("Failed to append %d bytes to %s; batch dropped", len(buffer), self.path)
+            buffer.clear()
+
+    def _append(self, data: bytes) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(data)
+
+
+# Global writer instances
+audit_writer = AuditWriter(LOG_DIR / "audit.ndjson")
+provenance_writer = AuditWriter(LOG_DIR / "provenance.ndjson")
@@ -1,22 +1,33 @@
-from typing import Dict, Any, List
-from .storage import terminology_store
+from typing import Callable, Dict, Any, Iterator, Tuple
+import orjson
+from .storage import Term, terminology_store
 
 
 BASE_URL = 'http://example.com'
 NAMASTE_CS_URL = f'{BASE_URL}/CodeSystem/namaste'
 ICD11_URL = 'http://id.who.int/icd11'
 
+# serialized payloads keyed by name -> (store version, bytes)
+_payload_cache: Dict[str, Tuple[int, bytes]] = {}
+
+
+def _concept(term: Term) -> Dict[str, Any]:
+    concept: Dict[str, Any] = {
+        'code': term.code,
+        'display': term.label,
+    }
+    if term.synonyms:
+        concept['designation'] = [{'value': s} for s in term.synonyms]
+    return concept
+
+
+def _element(term: Term) -> Dict[str, Any]:
+    targets = [{'code': c, 'equivalence': 'equivalent'} for c in term.icd11_tm2_codes]
+    return {'code': term.code, 'target': targets}
+
 
 def build_codesystem() -> Dict[str, Any]:
-    concepts: List[Dict[str, Any]] = []
-    for term in terminology_store.namaste.values():
-        concept: Dict[str, Any] = {
-            'code': term.code,
-            'display': term.label,
-        }
-        if term.synonyms:
-            concept['designation'] = [{'value': s} for s in term.synonyms]
-        concepts.append(concept)
+    concepts = [_concept(term) for term in terminology_store.namaste.values()]
     return {
         'resourceType': 'CodeSystem',
         'id': 'namaste',
@@ -30,13 +41,7 @@ def build_codesystem() -> Dict[str, Any]:
 
 
 def build_conceptmap() -> Dict[str, Any]:
-    elements: List[Dict[str, Any]] = []
-    for term in terminology_store.namaste.values():
-        targets = []
-        for icd in term.icd11_tm2_codes:
-            code_only = icd.replace('ICD-11:', '').strip()
-            targets.append({'code': code_only, 'equivalence': 'equivalent'})
-        elements.append({'code': term.code, 'target': targets})
+    elements = [_element(term) for term in terminology_store.namaste.values()]
     return {
         'resourceType': 'ConceptMap',
         'id': 'namaste-to-icd11',
@@ -51,4 +56,35 @@ def build_conceptmap() -> Dict[str, Any]:
     }
 
 
+def _cached_payload(name: str, build: Callable[[], Dict[str, Any]]) -> bytes:
+    version = terminology_store.version
+    cached = _payload_cache.get(name)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    payload = orjson.dumps(build())
+    _payload_cache[name] = (version, payload)
+    return payload
+
+
+def build_codesystem_bytes() -> bytes:
+    return _cached_payload('codesystem', build_codesystem)
+
+
+def build_conceptmap_bytes() -> bytes:
+    return _cached_payload('conceptmap', build_conceptmap)
+
+
+def _stream(encode: Callable[[Term], Dict[str, Any]]) -> Iterator[bytes]:
+    # snapshot the term references so a concurrent ingest can't break iteration
+    for term in list(terminology_store.namaste.values()):
+        yield orjson.dumps(encode(term)) + b'\n'
+
+
+def build_codesystem_stream() -> Iterator[bytes]:
+    """CodeSystem concepts as NDJSON, one concept per line"""
+    return _stream(_concept)
+
 
+def build_conceptmap_stream() -> Iterator[bytes]:
+    """ConceptMap group elements as NDJSON, one element per line"""
+    return _stream(_element)
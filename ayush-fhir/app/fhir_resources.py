@@ -2,30 +2,204 @@
 FHIR R4 Resources for NAMASTE-ICD-11 Integration
 Implements proper FHIR resources per India's 2016 EHR Standards
 """
-from typing import Dict, List, Any, Optional
-from datetime import datetime
-import uuid
+from typing import Dict, Any, Optional, Sequence, Tuple
+from functools import lru_cache
+import secrets
+import time
 from .storage import terminology_store
 from .snomed_loinc import get_semantic_coding
 
 
-def create_problem_list_entry(
-    namaste_code: str,
-    icd11_codes: List[str],
-    patient_id: str = "patient-001",
-    practitioner_id: str = "practitioner-001",
-    encounter_id: str = "encounter-001"
-) -> Dict[str, Any]:
+# Constant sub-structures shared by every resource built below. Resources are
+# only ever serialized, never mutated, so the same objects are reused.
+_CONDITION_META = {
+    "profile": ["http://hl7.org/fhir/StructureDefinition/Condition"]
+}
+
+_CLINICAL_STATUS_ACTIVE = {
+    "coding": [
+        {
+            "system": "http://terminology.hl7.org/CodeSystem/condition-clinical",
+            "code": "active",
+            "display": "Active"
+        }
+    ]
+}
+
+_VERIFICATION_CONFIRMED = {
+    "coding": [
+        {
+            "system": "http://terminology.hl7.org/CodeSystem/condition-ver-status",
+            "code": "confirmed",
+            "display": "Confirmed"
+        }
+    ]
+}
+
+_CATEGORY_ENCOUNTER_DIAGNOSIS = [
+    {
+        "coding": [
+            {
+                "system": "http://terminology.hl7.org/CodeSystem/condition-category",
+                "code": "encounter-diagnosis",
+                "display": "Encounter Diagnosis"
+            }
+        ]
+    }
+]
+
+_ENCOUNTER_CLASS_AMBULATORY = {
+    "system": "http://terminology.hl7.org/CodeSystem/v3-ActCode",
+    "code": "AMB",
+    "display": "ambulatory"
+}
+
+_CONSENT_SCOPE = {
+    "coding": [
+        {
+            "system": "http://terminology.hl7.org/CodeSystem/consentscope",
+            "code": "patient-privacy",
+            "display": "Patient Privacy"
+        }
+    ]
+}
+
+_CONSENT_CATEGORY = [
+    {
+        "coding": [
+            {
+                "system": "http://terminology.hl7.org/CodeSystem/consentcategorycodes",
+                "code": "INFAO",
+                "display": "Information Access"
+            }
+        ]
+    }
+]
+
+_CONSENT_POLICY_RULE = {
+    "coding": [
+        {
+            "system": "http://terminology.hl7.org/CodeSystem/consentpolicycodes",
+            "code": "OPTIN",
+            "display": "Opt In"
+        }
+    ]
+}
+
+_CONSENT_ACTION_ACCESS = [
+    {
+        "coding": [
+            {
+                "system": "http://terminology.hl7.org/CodeSystem/consentaction",
+                "code": "access",
+                "display": "Access"
+            }
+        ]
+    }
+]
+
+_AUDIT_TYPE_REST = {
+    "system": "http://terminology.hl7.org/CodeSystem/audit-event-type",
+    "code": "rest",
+    "display": "RESTful Operation"
+}
+
+_AUDIT_SUBTYPE_CREATE = [
+    {
+        "system": "http://hl7.org/fhir/restful-interaction",
+        "code": "create",
+        "display": "Create"
+    }
+]
+
+_AUDIT_SUBTYPE_READ = [
+    {
+        "system": "http://hl7.org/fhir/restful-interaction",
+        "code": "read",
+        "display": "Read"
+    }
+]
+
+_AUDIT_AGENT_TYPE_DEVICE = {
+    "coding": [
+        {
+            "system": "http://terminology.hl7.org/CodeSystem/audit-agent-type",
+            "code": "1",
+            "display": "User Device"
+        }
+    ]
+}
+
+_AUDIT_SOURCE = {
+    "site": "ayush-fhir-service",
+    "observer": {
+        "reference": "Device/ayush-fhir-device"
+    }
+}
+
+_AUDIT_ENTITY_TYPE_SYSTEM_OBJECT = {
+    "system": "http://terminology.hl7.org/CodeSystem/audit-entity-type",
+    "code": "2",
+    "display": "System Object"
+}
+
+_AUDIT_ENTITY_ROLE_DOMAIN_RESOURCE = {
+    "system": "http://terminology.hl7.org/CodeSystem/object-role",
+    "code": "4",
+    "display": "Domain Resource"
+}
+
+_PROVENANCE_AGENT_TYPE_AUTHOR = {
+    "coding": [
+        {
+            "system": "http://terminology.hl7.org/CodeSystem/provenance-participant-type",
+            "code": "author",
+            "display": "Author"
+        }
+    ]
+}
+
+_PROVENANCE_ACTIVITY_CREATE = {
+    "coding": [
+        {
+            "system": "http://terminology.hl7.org/CodeSystem/v3-DataOperation",
+            "code": "CREATE",
+            "display": "Create"
+        }
+    ]
+}
+
+
+# (epoch second, formatted instant) of the last timestamp handed out
+_now_cache: Tuple[int, str] = (-1, "")
+
+
+def iso_now() -> str:
     """
-    Create FHIR ProblemList entry with dual coding (NAMASTE + ICD-11)
-    Complies with ICD-11 coding rules for multiple codings
+    Current UTC time as a FHIR instant (second precision)
+    Formatting is done at most once per wall-clock second
+    """
+    global _now_cache
+    second = int(time.time())
+    if _now_cache[0] != second:
+        _now_cache = (second, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(second)))
+    return _now_cache[1]
+
+
+def _rid() -> str:
+    """Short random resource id suffix (8 hex chars)"""
+    return secrets.token_hex(4)
+
+
+@lru_cache(maxsize=1024)
+def _condition_code(namaste_code: str, label: str, icd11_codes: Tuple[str, ...]) -> Dict[str, Any]:
+    """
+    Dual-coded CodeableConcept (NAMASTE + ICD-11 + SNOMED CT) for a term
+    Shared between resources like the constants above; keyed on the label too so
+    a re-ingested term never gets a stale display
     """
-    term = terminology_store.namaste.get(namaste_code)
-    if not term:
-        raise ValueError(f"NAMASTE code {namaste_code} not found")
-    
     # Get semantic coding (SNOMED CT for clinical findings)
-    semantic = get_semantic_coding(term.label, "clinical")
+    semantic = get_semantic_coding(label, "clinical")
     
     # Build coding array with multiple systems
     codings = []
@@ -34,7 +208,7 @@ def create_problem_list_entry(
     codings.append({
         "system": "http://example.com/CodeSystem/namaste",
         "code": namaste_code,
-        "display": term.label
+        "display": label
     })
     
     # ICD-11 TM2 codings
@@ -57,51 +231,42 @@ def create_problem_list_entry(
     if semantic.get("snomed"):
         codings.append(semantic["snomed"])
     
+    return {
+        "coding": codings,
+        "text": label
+    }
+
+
+def create_problem_list_entry(
+    namaste_code: str,
+    icd11_codes: Sequence[str],
+    patient_id: str = "patient-001",
+    practitioner_id: str = "practitioner-001",
+    encounter_id: str = "encounter-001"
+) -> Dict[str, Any]:
+    """
+    Create FHIR ProblemList entry with dual coding (NAMASTE + ICD-11)
+    Complies with ICD-11 coding rules for multiple codings
+    """
+    term = terminology_store.namaste.get(namaste_code)
+    if not term:
+        raise ValueError(f"NAMASTE code {namaste_code} not found")
+    
     condition = {
         "resourceType": "Condition",
-        "id": f"condition-{uuid.uuid4().hex[:8]}",
-        "meta": {
-            "profile": ["http://hl7.org/fhir/StructureDefinition/Condition"]
-        },
+        "id": f"condition-{_rid()}",
+        "meta": _CONDITION_META,
         "identifier": [
             {
                 "system": "http://example.com/conditions",
-                "value": f"COND-{uuid.uuid4().hex[:8]}"
-            }
-        ],
-        "clinicalStatus": {
-            "coding": [
-                {
-                    "system": "http://terminology.hl7.org/CodeSystem/condition-clinical",
-                    "code": "active",
-                    "display": "Active"
-                }
-            ]
-        },
-        "verificationStatus": {
-            "coding": [
-                {
-                    "system": "http://terminology.hl7.org/CodeSystem/condition-ver-status",
-                    "code": "confirmed",
-                    "display": "Confirmed"
-                }
-            ]
-        },
-        "category": [
-            {
-                "coding": [
-                    {
-                        "system": "http://terminology.hl7.org/CodeSystem/condition-category",
-                        "code": "encounter-diagnosis",
-                        "display": "Encounter Diagnosis"
-                    }
-                ]
+                "value": f"COND-{_rid()}"
             }
         ],
-        "code": {
-            "coding": codings,
-            "text": term.label
-        },
+        "clinicalStatus": _CLINICAL_STATUS_ACTIVE,
+        "verificationStatus": _VERIFICATION_CONFIRMED,
+        "category": _CATEGORY_ENCOUNTER_DIAGNOSIS,
+        # a no-op for the tuples the store holds; other sequences are frozen for the cache key
+        "code": _condition_code(namaste_code, term.label, tuple(icd11_codes)),
         "subject": {
             "reference": f"Patient/{patient_id}",
             "display": "Patient"
@@ -110,7 +275,7 @@ def create_problem_list_entry(
             "reference": f"Encounter/{encounter_id}",
             "display": "Encounter"
         },
-        "recordedDate": datetime.now().isoformat() + "Z",
+        "recordedDate": iso_now(),
         "recorder": {
             "reference": f"Practitioner/{practitioner_id}",
             "display": "Practitioner"
@@ -131,15 +296,12 @@ def create_encounter(
     encounter_type: str = "outpatient"
 ) -> Dict[str, Any]:
     """Create FHIR Encounter resource"""
+    now = iso_now()
     return {
         "resourceType": "Encounter",
-        "id": f"encounter-{uuid.uuid4().hex[:8]}",
+        "id": f"encounter-{_rid()}",
         "status": "finished",
-        "class": {
-            "system": "http://terminology.hl7.org/CodeSystem/v3-ActCode",
-            "code": "AMB",
-            "display": "ambulatory"
-        },
+        "class": _ENCOUNTER_CLASS_AMBULATORY,
         "type": [
             {
                 "coding": [
@@ -164,8 +326,8 @@ def create_encounter(
             }
         ],
         "period": {
-            "start": datetime.now().isoformat() + "Z",
-            "end": datetime.now().isoformat() + "Z"
+            "start": now,
+            "end": now
         }
     }
 
@@ -251,42 +413,16 @@ def create_consent(
     """Create FHIR Consent resource per ISO 22600"""
     return {
         "resourceType": "Consent",
-        "id": f"consent-{uuid.uuid4().hex[:8]}",
+        "id": f"consent-{_rid()}",
         "status": "active",
-        "scope": {
-            "coding": [
-                {
-                    "system": "http://terminology.hl7.org/CodeSystem/consentscope",
-                    "code": "patient-privacy",
-                    "display": "Patient Privacy"
-                }
-            ]
-        },
-        "category": [
-            {
-                "coding": [
-                    {
-                        "system": "http://terminology.hl7.org/CodeSystem/consentcategorycodes",
-                        "code": "INFAO",
-                        "display": "Information Access"
-                    }
-                ]
-            }
-        ],
+        "scope": _CONSENT_SCOPE,
+        "category": _CONSENT_CATEGORY,
         "patient": {
             "reference": f"Patient/{patient_id}",
             "display": "Patient"
         },
-        "dateTime": datetime.now().isoformat() + "Z",
-        "policyRule": {
-            "coding": [
-                {
-                    "system": "http://terminology.hl7.org/CodeSystem/consentpolicycodes",
-                    "code": "OPTIN",
-                    "display": "Opt In"
-                }
-            ]
-        },
+        "dateTime": iso_now(),
+        "policyRule": _CONSENT_POLICY_RULE,
         "provision": {
             "type": "permit",
             "purpose": [
@@ -296,17 +432,7 @@ def create_consent(
                     "display": purpose.title()
                 }
             ],
-            "action": [
-                {
-                    "coding": [
-                        {
-                            "system": "http://terminology.hl7.org/CodeSystem/consentaction",
-                            "code": "access",
-                            "display": "Access"
-                        }
-                    ]
-                }
-            ]
+            "action": _CONSENT_ACTION_ACCESS
         }
     }
 
@@ -320,56 +446,25 @@ def create_audit_event(
     """Create FHIR AuditEvent resource per EHR Standards"""
     return {
         "resourceType": "AuditEvent",
-        "id": f"audit-{uuid.uuid4().hex[:8]}",
-        "type": {
-            "system": "http://terminology.hl7.org/CodeSystem/audit-event-type",
-            "code": "rest",
-            "display": "RESTful Operation"
-        },
-        "subtype": [
-            {
-                "system": "http://hl7.org/fhir/restful-interaction",
-                "code": "create" if action == "C" else "read",
-                "display": "Create" if action == "C" else "Read"
-            }
-        ],
+        "id": f"audit-{_rid()}",
+        "type": _AUDIT_TYPE_REST,
+        "subtype": _AUDIT_SUBTYPE_CREATE if action == "C" else _AUDIT_SUBTYPE_READ,
         "action": action,
-        "recorded": datetime.now().isoformat() + "Z",
+        "recorded": iso_now(),
         "outcome": outcome,
         "outcomeDesc": "Success" if outcome == "0" else "Failure",
         "agent": [
             {
-                "type": {
-                    "coding": [
-                        {
-                            "system": "http://terminology.hl7.org/CodeSystem/audit-agent-type",
-                            "code": "1",
-                            "display": "User Device"
-                        }
-                    ]
-                },
+                "type": _AUDIT_AGENT_TYPE_DEVICE,
                 "requestor": True,
                 "name": agent_name
             }
         ],
-        "source": {
-            "site": "ayush-fhir-service",
-            "observer": {
-                "reference": "Device/ayush-fhir-device"
-            }
-        },
+        "source": _AUDIT_SOURCE,
         "entity": [
             {
-                "type": {
-                    "system": "http://terminology.hl7.org/CodeSystem/audit-entity-type",
-                    "code": "2",
-                    "display": "System Object"
-                },
-                "role": {
-                    "system": "http://terminology.hl7.org/CodeSystem/object-role",
-                    "code": "4",
-                    "display": "Domain Resource"
-                },
+                "type": _AUDIT_ENTITY_TYPE_SYSTEM_OBJECT,
+                "role": _AUDIT_ENTITY_ROLE_DOMAIN_RESOURCE,
                 "what": {
                     "reference": f"{resource_type}/example"
                 }
@@ -385,37 +480,21 @@ def create_provenance(
     """Create FHIR Provenance resource"""
     return {
         "resourceType": "Provenance",
-        "id": f"provenance-{uuid.uuid4().hex[:8]}",
+        "id": f"provenance-{_rid()}",
         "target": [
             {
                 "reference": target_reference
             }
         ],
-        "recorded": datetime.now().isoformat() + "Z",
+        "recorded": iso_now(),
         "agent": [
             {
-                "type": {
-                    "coding": [
-                        {
-                            "system": "http://terminology.hl7.org/CodeSystem/provenance-participant-type",
-                            "code": "author",
-                            "display": "Author"
-                        }
-                    ]
-                },
+                "type": _PROVENANCE_AGENT_TYPE_AUTHOR,
                 "who": {
                     "display": agent_name
                 }
             }
         ],
-        "activity": {
-            "coding": [
-                {
-                    "system": "http://terminology.hl7.org/CodeSystem/v3-DataOperation",
-                    "code": "CREATE",
-                    "display": "Create"
-                }
-            ]
-        }
+        "activity": _PROVENANCE_ACTIVITY_CREATE
     }
 
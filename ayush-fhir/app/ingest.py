@@ -1,35 +1,61 @@
+import csv
 import io
-import pandas as pd
+from pathlib import Path
+from typing import Dict, List, Tuple
 from .storage import Term, terminology_store
 
 
 REQUIRED_COLUMNS = ['id', 'term', 'category', 'synonyms', 'icd11_tm2_code']
+DEFAULT_DATASET_PATH = Path(__file__).resolve().parents[1] / 'data' / 'namaste_200.csv'
 
 
-def ingest_csv_file(content_bytes: bytes) -> int:
-    buf = io.BytesIO(content_bytes)
-    df = pd.read_csv(buf)
-    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
-    if missing:
-        raise ValueError(f"Missing required columns: {missing}")
-    # Validate uniqueness of term id
-    if not df['id'].is_unique:
-        raise ValueError('Duplicate ids found in CSV')
-
-    terminology_store.clear()
-    count = 0
-    for _, row in df.iterrows():
-        code = str(row['id']).strip()
-        label = str(row['term']).strip()
-        category = None if pd.isna(row['category']) else str(row['category']).strip()
-        synonyms_raw = '' if pd.isna(row['synonyms']) else str(row['synonyms'])
-        synonyms = [s.strip() for s in synonyms_raw.split(',') if s.strip()]
-        icd_raw = '' if pd.isna(row['icd11_tm2_code']) else str(row['icd11_tm2_code'])
-        icd_codes = [c.strip() for c in icd_raw.split(',') if c.strip()]
-        term = Term(code=code, label=label, category=category, synonyms=synonyms, icd11_tm2_codes=icd_codes)
-        terminology_store.add_term(term)
-        count += 1
-    return count
+def _split_list(raw: str | None, shared: Dict[str, str]) -> Tuple[str, ...]:
+    # shared maps each value to its first occurrence, so repeats across rows are one object
+    return tuple(shared.setdefault(s, s) for s in (s.strip() for s in (raw or '').split(',')) if s)
+
 
+def _split_codes(raw: str | None, shared: Dict[str, str]) -> Tuple[str, ...]:
+    # stored without the 'ICD-11:' prefix so readers never re-normalize
+    codes = (s.strip() for s in (raw or '').split(','))
+    return tuple(shared.setdefault(c, c) for c in (c.removeprefix('ICD-11:').strip() for c in codes if c))
 
 
+def ingest_csv_file(content_bytes: bytes) -> int:
+    # decode in one pass; newline='' lets csv handle line breaks inside quoted fields
+    reader = csv.reader(io.StringIO(content_bytes.decode('utf-8-sig'), newline=''))
+    columns = next(reader, [])
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {missing}")
+    # plain rows indexed by position; no per-row dict like DictReader builds
+    # (a repeated header name resolves to its last column, as with DictReader)
+    position = {name: i for i, name in enumerate(columns)}
+    id_i, term_i, category_i, synonyms_i, icd_i = (position[c] for c in REQUIRED_COLUMNS)
+    width = len(columns)
+
+    # Parse everything first so a bad file never leaves the store half-loaded
+    terms: List[Term] = []
+    ids: set[str] = set()
+    # per-file dedup table rather than sys.intern, so uploads never grow a process-wide table
+    shared: Dict[str, str] = {}
+    for row in reader:
+        if not row:
+            continue
+        if len(row) < width:
+            # short rows read as empty fields
+            row += [''] * (width - len(row))
+        code = row[id_i].strip()
+        if code in ids:
+            raise ValueError('Duplicate ids found in CSV')
+        ids.add(code)
+        category = row[category_i].strip()
+        terms.append(Term(
+            code=code,
+            label=row[term_i].strip(),
+            category=shared.setdefault(category, category) if category else None,
+            synonyms=_split_list(row[synonyms_i], shared),
+            icd11_tm2_codes=_split_codes(row[icd_i], shared),
+        ))
+
+    terminology_store.replace_terms(terms)
+    return len(terms)
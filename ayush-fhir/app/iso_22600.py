@@ -2,10 +2,13 @@
 ISO 22600 Access Control Implementation
 Implements privilege management and access control per India's EHR Standards
 """
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Callable, Dict, FrozenSet, List, Any, Optional, Tuple
+from collections import OrderedDict
 from dataclasses import dataclass
 from enum import Enum
+import itertools
 import json
+import threading
 from datetime import datetime
 
 
@@ -16,6 +19,11 @@ class Action(Enum):
     SEARCH = "search"
 
 
+# One bit per action so a role's permissions collapse to a single int mask
+_ACTION_BITS: Dict[Action, int] = {action: 1 << i for i, action in enumerate(Action)}
+_ACTION_BY_VALUE: Dict[str, Action] = {action.value: action for action in Action}
+
+
 class Purpose(Enum):
     TREATMENT = "TREATMENT"
     PAYMENT = "PAYMENT"
@@ -24,16 +32,19 @@ class Purpose(Enum):
     PUBLIC_HEALTH = "PUBLIC_HEALTH"
 
 
-@dataclass
+_PURPOSE_BY_VALUE: Dict[str, Purpose] = {purpose.value: purpose for purpose in Purpose}
+
+
+@dataclass(slots=True, frozen=True)
 class Subject:
     """Subject (who) in access control"""
     id: str
     type: str  # "practitioner", "patient", "system"
-    roles: List[str]
+    roles: Tuple[str, ...]
     organization: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Resource:
     """Resource (what) in access control"""
     id: str
@@ -51,7 +62,7 @@ class AccessRequest:
     context: Optional[Dict[str, Any]] = None
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ConsentRule:
     """Consent rule from FHIR Consent resource"""
     patient_id: str
@@ -65,166 +76,194 @@ class ConsentRule:
 class ISO22600AccessControl:
     """ISO 22600 compliant access control system"""
     
+    decision_cache_size = 4096
+    
     def __init__(self):
         self.consent_rules: List[ConsentRule] = []
-        self.role_permissions: Dict[str, List[Action]] = {
-            "doctor": [Action.READ, Action.WRITE, Action.SEARCH],
-            "nurse": [Action.READ, Action.SEARCH],
-            "patient": [Action.READ],
-            "system": [Action.READ, Action.WRITE, Action.SEARCH, Action.DELETE],
-            "researcher": [Action.READ, Action.SEARCH]
+        # Consent rules indexed by (purpose, action, resource_type); "*" rules by (purpose, action)
+        self._rules_by_key: Dict[Tuple[Purpose, Action, str], List[ConsentRule]] = {}
+        self._wildcard_rules: Dict[Tuple[Purpose, Action], List[ConsentRule]] = {}
+        self._research_allowed = False
+        # LRU of (allowed, reason) per request key; invalidated when consents change
+        self._decision_cache: OrderedDict[tuple, Tuple[bool, str]] = OrderedDict()
+        self._decision_lock = threading.Lock()
+        # Bumped by clear_cache(); a decision evaluated under an older value is not stored
+        self._cache_gen = 0
+        self.role_permissions: Dict[str, FrozenSet[Action]] = {
+            "doctor": frozenset({Action.READ, Action.WRITE, Action.SEARCH}),
+            "nurse": frozenset({Action.READ, Action.SEARCH}),
+            "patient": frozenset({Action.READ}),
+            "system": frozenset({Action.READ, Action.WRITE, Action.SEARCH, Action.DELETE}),
+            "researcher": frozenset({Action.READ, Action.SEARCH})
+        }
+        self._role_action_mask: Dict[str, int] = {}
+        self._build_role_masks()
+        # Policy compiled into a single closure; rebuilt lazily after any change
+        self._compiled: Optional[Callable[[AccessRequest], Tuple[bool, str]]] = None
+        # Serializes rule/role changes with compiling, so a closure is never built
+        # from half-updated rules or published after the change that invalidated it
+        self._policy_lock = threading.RLock()
+    
+    @property
+    def generation(self) -> int:
+        """Policy generation; changes whenever consents or role permissions are reloaded"""
+        return self._cache_gen
+    
+    def _build_role_masks(self) -> None:
+        """Precompute an action bitmask per role from role_permissions"""
+        self._role_action_mask = {
+            role: sum(_ACTION_BITS[action] for action in set(actions))
+            for role, actions in self.role_permissions.items()
         }
     
     def add_consent_rule(self, rule: ConsentRule) -> None:
         """Add consent rule"""
-        self.consent_rules.append(rule)
+        with self._policy_lock:
+            self.consent_rules.append(rule)
+            if rule.resource_type == "*":
+                self._wildcard_rules.setdefault((rule.purpose, rule.action), []).append(rule)
+            else:
+                key = (rule.purpose, rule.action, rule.resource_type)
+                self._rules_by_key.setdefault(key, []).append(rule)
+            if rule.purpose == Purpose.RESEARCH and rule.allow:
+                self._research_allowed = True
+            self.clear_cache()
+    
+    def clear_cache(self) -> None:
+        """Drop memoized decisions and role masks (call after changing role_permissions)"""
+        with self._policy_lock:
+            self._build_role_masks()
+            self._compiled = None
+        with self._decision_lock:
+            self._cache_gen += 1
+            self._decision_cache.clear()
     
     def check_access(self, request: AccessRequest) -> Tuple[bool, str]:
         """
         Check if access is allowed per ISO 22600
         Returns (allowed, reason)
         """
-        # Check role-based permissions
-        if not self._check_role_permissions(request):
-            return False, "Insufficient role permissions"
-        
-        # Check consent rules
-        if not self._check_consent_rules(request):
-            return False, "Consent not granted"
-        
-        # Check purpose limitation
-        if not self._check_purpose_limitation(request):
-            return False, "Purpose not allowed"
-        
-        # Check data minimization
-        if not self._check_data_minimization(request):
-            return False, "Data minimization violation"
-        
-        return True, "Access granted"
-    
-    def _check_role_permissions(self, request: AccessRequest) -> bool:
-        """Check if subject's role allows the action"""
-        for role in request.subject.roles:
-            if role in self.role_permissions:
-                if request.action in self.role_permissions[role]:
-                    return True
-        return False
-    
-    def _check_consent_rules(self, request: AccessRequest) -> bool:
-        """Check consent rules"""
-        # Find applicable consent rules
-        applicable_rules = [
-            rule for rule in self.consent_rules
-            if (rule.purpose == request.purpose and
-                rule.action == request.action and
-                (rule.resource_type == request.resource.type or rule.resource_type == "*"))
-        ]
-        
-        if not applicable_rules:
-            # No specific consent rules - check default
-            return self._check_default_consent(request)
-        
-        # Check if any rule allows access
-        for rule in applicable_rules:
-            if rule.allow:
-                return True
-        
-        return False
-    
-    def _check_default_consent(self, request: AccessRequest) -> bool:
-        """Check default consent rules"""
-        # Default: allow treatment-related access for healthcare providers
-        if (request.purpose == Purpose.TREATMENT and
-            "doctor" in request.subject.roles and
-            request.action in [Action.READ, Action.WRITE]):
-            return True
-        
-        # Default: allow patients to read their own data
-        if (request.subject.type == "patient" and
-            request.action == Action.READ and
-            request.resource.owner == request.subject.id):
-            return True
-        
-        return False
+        subject, resource = request.subject, request.resource
+        key = (
+            subject.id, subject.type, tuple(sorted(set(subject.roles))),
+            request.action, request.purpose, resource.type, resource.owner
+        )
+        return self._decide(key, lambda: request)
     
-    def _check_purpose_limitation(self, request: AccessRequest) -> bool:
-        """Check purpose limitation principle"""
-        # Treatment purpose is generally allowed
-        if request.purpose == Purpose.TREATMENT:
-            return True
-        
-        # Research requires explicit consent
-        if request.purpose == Purpose.RESEARCH:
-            return any(
-                rule.purpose == Purpose.RESEARCH and rule.allow
-                for rule in self.consent_rules
-            )
-        
-        # Payment and operations require appropriate roles
-        if request.purpose in [Purpose.PAYMENT, Purpose.HEALTHCARE_OPERATIONS]:
-            return "doctor" in request.subject.roles or "system" in request.subject.roles
+    def _decide(self, key: tuple, make_request: Callable[[], AccessRequest]) -> Tuple[bool, str]:
+        """Memoized decision for key; make_request only runs on a cache miss"""
+        with self._decision_lock:
+            decision = self._decision_cache.get(key)
+            if decision is not None:
+                self._decision_cache.move_to_end(key)
+                return decision
+            cache_gen = self._cache_gen
         
-        return True
+        with self._policy_lock:
+            evaluate = self._compiled
+            if evaluate is None:
+                evaluate = self._compiled = self._compile()
+        decision = evaluate(make_request())
+        with self._decision_lock:
+            if self._cache_gen != cache_gen:
+                # the policy changed while evaluating; don't cache a possibly stale answer
+                return decision
+            self._decision_cache[key] = decision
+            if len(self._decision_cache) > self.decision_cache_size:
+                self._decision_cache.popitem(last=False)
+        return decision
     
-    def _check_data_minimization(self, request: AccessRequest) -> bool:
-        """Check data minimization principle"""
-        # System actions are generally allowed
-        if request.subject.type == "system":
-            return True
-        
-        # Patients can access their own data
-        if (request.subject.type == "patient" and
-            request.resource.owner == request.subject.id):
-            return True
+    def _compile(self) -> Callable[[AccessRequest], Tuple[bool, str]]:
+        """
+        Bind the current roles and consent rules into one closure that runs the
+        ISO 22600 checks in order: role permissions, consent, purpose limitation
+        and data minimization
+        """
+        role_masks = dict(self._role_action_mask)
+        action_bits = _ACTION_BITS
+        # Per (purpose, action[, resource_type]): whether any matching rule allows
+        exact_allow = {key: any(r.allow for r in rules) for key, rules in self._rules_by_key.items()}
+        wildcard_allow = {key: any(r.allow for r in rules) for key, rules in self._wildcard_rules.items()}
+        research_allowed = self._research_allowed
+        treatment, research = Purpose.TREATMENT, Purpose.RESEARCH
+        role_gated_purposes = frozenset({Purpose.PAYMENT, Purpose.HEALTHCARE_OPERATIONS})
+        default_treatment_actions = frozenset({Action.READ, Action.WRITE})
+        read = Action.READ
         
-        # Healthcare providers can access patient data for treatment
-        if (request.purpose == Purpose.TREATMENT and
-            "doctor" in request.subject.roles):
-            return True
+        def evaluate(request: AccessRequest) -> Tuple[bool, str]:
+            subject, resource = request.subject, request.resource
+            roles = subject.roles
+            action, purpose = request.action, request.purpose
+            
+            # Role-based permissions
+            bit = action_bits[action]
+            if not any(role_masks.get(role, 0) & bit for role in roles):
+                return False, "Insufficient role permissions"
+            
+            is_doctor = "doctor" in roles
+            own_record = subject.type == "patient" and resource.owner == subject.id
+            
+            # Consent rules, falling back to the defaults when none apply
+            exact = exact_allow.get((purpose, action, resource.type))
+            wildcard = wildcard_allow.get((purpose, action))
+            if exact is None and wildcard is None:
+                # treatment by doctors, and patients reading their own data
+                consent = (
+                    (purpose == treatment and is_doctor and action in default_treatment_actions) or
+                    (own_record and action == read)
+                )
+            else:
+                consent = bool(exact) or bool(wildcard)
+            if not consent:
+                return False, "Consent not granted"
+            
+            # Purpose limitation: research needs explicit consent, payment and
+            # operations need a doctor or system role
+            if purpose == research:
+                if not research_allowed:
+                    return False, "Purpose not allowed"
+            elif purpose in role_gated_purposes and not (is_doctor or "system" in roles):
+                return False, "Purpose not allowed"
+            
+            # Data minimization
+            if not (subject.type == "system" or own_record or (purpose == treatment and is_doctor)):
+                return False, "Data minimization violation"
+            
+            return True, "Access granted"
         
-        return False
+        return evaluate
     
     def create_consent_from_fhir(self, consent_resource: Dict[str, Any]) -> List[ConsentRule]:
         """Create consent rules from FHIR Consent resource"""
-        rules = []
-        
-        patient_ref = consent_resource.get("patient", {}).get("reference", "")
-        patient_id = patient_ref.replace("Patient/", "") if patient_ref else ""
+        # Missing and explicit null elements are treated alike
+        patient_ref = (consent_resource.get("patient") or {}).get("reference") or ""
+        patient_id = patient_ref.removeprefix("Patient/")
         
-        provision = consent_resource.get("provision", {})
-        provision_type = provision.get("type", "permit")
-        allow = provision_type == "permit"
+        provision = consent_resource.get("provision") or {}
+        allow = provision.get("type", "permit") == "permit"
         
-        # Extract purpose
-        purposes = provision.get("purpose", [])
-        for purpose_coding in purposes:
-            purpose_code = purpose_coding.get("code", "")
-            purpose = Purpose(purpose_code) if purpose_code in [p.value for p in Purpose] else Purpose.TREATMENT
-            
-            # Extract actions
-            actions = provision.get("action", [])
-            for action_coding in actions:
-                action_code = action_coding.get("code", "")
-                action = Action(action_code) if action_code in [a.value for a in Action] else Action.READ
-                
-                # Extract resource types
-                resource_types = provision.get("class", [])
-                if not resource_types:
-                    resource_types = [{"code": "*"}]  # Default to all resources
-                
-                for resource_type_coding in resource_types:
-                    resource_type = resource_type_coding.get("code", "*")
-                    
-                    rule = ConsentRule(
-                        patient_id=patient_id,
-                        purpose=purpose,
-                        action=action,
-                        resource_type=resource_type,
-                        allow=allow
-                    )
-                    rules.append(rule)
+        # Decode each provision list once; rules are their cross product
+        purposes = [
+            _PURPOSE_BY_VALUE.get(coding.get("code", ""), Purpose.TREATMENT)
+            for coding in provision.get("purpose") or []
+        ]
+        actions = [
+            _ACTION_BY_VALUE.get(coding.get("code", ""), Action.READ)
+            for coding in provision.get("action") or []
+        ]
+        # Default to all resources
+        resource_types = [coding.get("code", "*") for coding in provision.get("class") or []] or ["*"]
         
-        return rules
+        return [
+            ConsentRule(
+                patient_id=patient_id,
+                purpose=purpose,
+                action=action,
+                resource_type=resource_type,
+                allow=allow
+            )
+            for purpose, action, resource_type in itertools.product(purposes, actions, resource_types)
+        ]
 
 
 # Global access control instance
@@ -245,26 +284,26 @@ def check_resource_access(
     Check access to a resource
     Returns (allowed, reason)
     """
-    subject = Subject(
-        id=subject_id,
-        type=subject_type,
-        roles=subject_roles
+    # dict hit for known values; the enum constructor only runs to raise on bad input
+    action_enum = _ACTION_BY_VALUE.get(action) or Action(action)
+    purpose_enum = _PURPOSE_BY_VALUE.get(purpose) or Purpose(purpose)
+    # Same key as check_access, so a hit skips building the request objects;
+    # resource_id never affects the decision and is not part of it. _decide only
+    # caches the result if the policy generation did not move during evaluation
+    key = (
+        subject_id, subject_type, tuple(sorted(set(subject_roles))),
+        action_enum, purpose_enum, resource_type, patient_id
     )
     
-    resource = Resource(
-        id=resource_id,
-        type=resource_type,
-        owner=patient_id
-    )
-    
-    request = AccessRequest(
-        subject=subject,
-        action=Action(action),
-        resource=resource,
-        purpose=Purpose(purpose)
-    )
+    def make_request() -> AccessRequest:
+        return AccessRequest(
+            subject=Subject(id=subject_id, type=subject_type, roles=tuple(subject_roles)),
+            action=action_enum,
+            resource=Resource(id=resource_id, type=resource_type, owner=patient_id),
+            purpose=purpose_enum
+        )
     
-    return access_control.check_access(request)
+    return access_control._decide(key, make_request)
 
 
 def load_consent_from_fhir(consent_resource: Dict[str, Any]) -> None:
@@ -1,11 +1,61 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+import logging
+from pathlib import Path
+from fastapi import FastAPI, HTTPException, Request
+from . import api
 from .api import router as api_router
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pathlib import Path
-from .ingest import ingest_csv_file
+from fastapi.responses import FileResponse, ORJSONResponse
+from .ingest import DEFAULT_DATASET_PATH, ingest_csv_file
+from .audit import audit_writer, provenance_writer
+from .who_api import who_client
+from .assets import AssetAwareGZipMiddleware, asset_cache
+
+logger = logging.getLogger(__name__)
+
+
+async def preload_dataset(done: asyncio.Event) -> None:
+    # Auto-ingest default dataset once, in a worker thread so startup is not blocked
+    try:
+        if not DEFAULT_DATASET_PATH.exists():
+            logger.warning('Default dataset %s not found; starting with an empty store', DEFAULT_DATASET_PATH)
+            return
+        raw = await asyncio.to_thread(DEFAULT_DATASET_PATH.read_bytes)
+        await asyncio.to_thread(ingest_csv_file, raw)
+    except Exception:
+        # best-effort; keep serving with an empty store
+        logger.exception('Failed to preload default dataset')
+    finally:
+        done.set()
+
 
-app = FastAPI(title="Ayush Interop & FHIR Service", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Created here so it belongs to this lifespan's event loop
+    api.preload_done = done = asyncio.Event()
+    preload_task = asyncio.create_task(preload_dataset(done))
+    await asyncio.to_thread(asset_cache.load, Path('static/assets'))
+    await audit_writer.start()
+    await provenance_writer.start()
+    yield
+    await preload_task
+    api.preload_done = None
+    await audit_writer.stop()
+    await provenance_writer.stop()
+    await who_client.aclose()
+
+
+app = FastAPI(
+    title="Ayush Interop & FHIR Service",
+    version="0.1.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
+
+# FHIR payloads (CodeSystem/ConceptMap, search results) are large and repetitive
+# /assets/* is served precompressed from memory, so the middleware skips it
+app.add_middleware(AssetAwareGZipMiddleware, minimum_size=1024, exclude_prefixes=('/assets/',))
 
 app.include_router(api_router)
 
@@ -15,22 +65,14 @@ def health():
 
 # Serve frontend static files
 app.mount('/static', StaticFiles(directory='static', html=True), name='static')
-# Map absolute /assets/* requests (from Vite build) to static/assets
-app.mount('/assets', StaticFiles(directory='static/assets'), name='assets')
+# Map absolute /assets/* requests (from Vite build) to static/assets, served from memory
+@app.api_route('/assets/{path:path}', methods=['GET', 'HEAD'], include_in_schema=False)
+def assets(path: str, request: Request):
+    response = asset_cache.response(path, request)
+    if response is None:
+        raise HTTPException(status_code=404, detail='Not Found')
+    return response
 
 @app.get('/')
 def index():
     return FileResponse('static/index.html')
-
-@app.on_event('startup')
-def preload_dataset() -> None:
-    # Auto-ingest default dataset for smoother UX
-    data_path = Path(__file__).resolve().parents[1] / 'data' / 'namaste_200.csv'
-    if data_path.exists():
-        try:
-            ingest_csv_file(data_path.read_bytes())
-        except Exception:
-            # best-effort; ignore on startup
-            pass
-
-
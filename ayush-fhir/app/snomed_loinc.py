@@ -2,8 +2,48 @@
 SNOMED CT and LOINC Integration
 Implements semantic support for clinical observations and lab tests
 """
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Set, Tuple
+from collections import defaultdict
 from dataclasses import dataclass
+from functools import lru_cache
+
+
+# Vocabularies smaller than this are scanned directly instead of via the index
+INDEX_MIN_SIZE = 32
+
+
+class _TrigramIndex:
+    """Character-trigram index answering "query is a substring of key or display" lookups"""
+    
+    def __init__(self, entries: Dict[str, Any]):
+        self.keys = list(entries)
+        self.haystacks = [(key, entry.display.lower()) for key, entry in entries.items()]
+        self.postings: Dict[str, Set[int]] = defaultdict(set)
+        for i, texts in enumerate(self.haystacks):
+            for text in texts:
+                for j in range(len(text) - 2):
+                    self.postings[text[j:j + 3]].add(i)
+        # Repeated queries (CLI demos, type-ahead) are answered without rescanning
+        self.search = lru_cache(maxsize=256)(self._search)
+    
+    def _search(self, query_lower: str) -> Tuple[str, ...]:
+        """Keys whose term or lowercased display contains query_lower, in insertion order"""
+        if len(query_lower) < 3 or len(self.keys) < INDEX_MIN_SIZE:
+            candidates = range(len(self.keys))
+        else:
+            grams = {query_lower[j:j + 3] for j in range(len(query_lower) - 2)}
+            postings = sorted((self.postings.get(g, set()) for g in grams), key=len)
+            # rarest trigram first; stop as soon as nothing can match
+            matched = set(postings[0])
+            for posting in postings[1:]:
+                if not matched:
+                    break
+                matched &= posting
+            candidates = sorted(matched)
+        return tuple(
+            self.keys[i] for i in candidates
+            if query_lower in self.haystacks[i][0] or query_lower in self.haystacks[i][1]
+        )
 
 
 @dataclass
@@ -38,6 +78,11 @@ class SNOMEDCTService:
             "shwasa": SNOMEDConcept("13645005", "Cough", category="clinical-finding"),
             "jwara": SNOMEDConcept("386661006", "Fever", category="clinical-finding"),
         }
+        self.reindex()
+    
+    def reindex(self) -> None:
+        """Rebuild the search index; call after changing self.concepts"""
+        self._index = _TrigramIndex(self.concepts)
     
     def get_concept(self, term: str) -> Optional[SNOMEDConcept]:
         """Get SNOMED concept for a term"""
@@ -45,12 +90,7 @@ class SNOMEDCTService:
     
     def search_concepts(self, query: str) -> List[SNOMEDConcept]:
         """Search SNOMED concepts"""
-        results = []
-        query_lower = query.lower()
-        for term, concept in self.concepts.items():
-            if query_lower in term or query_lower in concept.display.lower():
-                results.append(concept)
-        return results
+        return [self.concepts[term] for term in self._index.search(query.lower())]
 
 
 class LOINCService:
@@ -70,6 +110,11 @@ class LOINCService:
             "prakriti": LOINCCode("LA33-6", "Constitutional type", category="observation"),
             "dosha": LOINCCode("LA34-4", "Dosha imbalance", category="observation"),
         }
+        self.reindex()
+    
+    def reindex(self) -> None:
+        """Rebuild the search index; call after changing self.codes"""
+        self._index = _TrigramIndex(self.codes)
     
     def get_code(self, term: str) -> Optional[LOINCCode]:
         """Get LOINC code for a term"""
@@ -77,12 +122,7 @@ class LOINCService:
     
     def search_codes(self, query: str) -> List[LOINCCode]:
         """Search LOINC codes"""
-        results = []
-        query_lower = query.lower()
-        for term, code in self.codes.items():
-            if query_lower in term or query_lower in code.display.lower():
-                results.append(code)
-        return results
+        return [self.codes[term] for term in self._index.search(query.lower())]
 
 
 # Global service instances
@@ -90,10 +130,13 @@ snomed_service = SNOMEDCTService()
 loinc_service = LOINCService()
 
 
+@lru_cache(maxsize=4096)
 def get_semantic_coding(term: str, category: str = "clinical") -> Dict[str, Any]:
     """
     Get appropriate semantic coding (SNOMED CT or LOINC) for a term
     Based on India's EHR Standards requirements
+    Results are memoized and shared between callers, so treat them as read-only;
+    call get_semantic_coding.cache_clear() if the service vocabularies change
     """
     result = {
         "snomed": None,
@@ -1,75 +1,244 @@
-from typing import Dict, List, Any, Tuple
+from typing import Dict, FrozenSet, List, Any, NamedTuple, Tuple
+from collections import OrderedDict
 from dataclasses import dataclass, field
+from bisect import bisect_left, bisect_right
 import difflib
+import heapq
+import threading
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Term:
     code: str
     label: str
     category: str | None = None
-    synonyms: List[str] = field(default_factory=list)
-    icd11_tm2_codes: List[str] = field(default_factory=list)
+    synonyms: Tuple[str, ...] = ()
+    icd11_tm2_codes: Tuple[str, ...] = ()
+    # lowercased forms used by search/suggest, derived in __post_init__
+    label_lc: str = field(default='', init=False, repr=False, compare=False)
+    synonyms_lc: Tuple[str, ...] = field(default=(), init=False, repr=False, compare=False)
+    label_tokens: FrozenSet[str] = field(default=frozenset(), init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # frozen, so derived fields go through object.__setattr__
+        object.__setattr__(self, 'synonyms', tuple(self.synonyms))
+        object.__setattr__(self, 'icd11_tm2_codes', tuple(self.icd11_tm2_codes))
+        object.__setattr__(self, 'label_lc', self.label.lower())
+        object.__setattr__(self, 'synonyms_lc', tuple(s.lower() for s in self.synonyms))
+        object.__setattr__(self, 'label_tokens', frozenset(self.label_lc.split()))
+
+
+class TermRow(NamedTuple):
+    """Search result row; call _asdict() where a JSON object is needed"""
+    code: str
+    label: str
+    synonyms: Tuple[str, ...]
+    icd11_tm2_codes: Tuple[str, ...]
+
+
+# sorts after any character, so q + _MAX_CHAR bounds the range of strings starting with q
+_MAX_CHAR = chr(0x10FFFF)
+# Suffixes are stored truncated to this many characters, so the suffix array
+# grows with name length times the cap instead of with length squared; longer
+# queries are narrowed on their first _SUFFIX_CAP characters and then verified
+_SUFFIX_CAP = 32
+# difflib similarity cutoff for the fuzzy fallbacks
+_FUZZY_CUTOFF = 0.6
+
+
+class _SearchIndex(NamedTuple):
+    version: int
+    # lowercased label/synonym -> codes of the terms that carry it
+    exact: Dict[str, List[str]]
+    # the exact keys sorted, so names starting with q are one bisect range
+    names: List[str]
+    # every suffix of every lowercased name (truncated to _SUFFIX_CAP), sorted;
+    # a substring query is a prefix range
+    suffixes: List[str]
+    suffix_codes: List[str]
+    # code -> its lowercased label and synonyms, to verify queries longer than the cap
+    names_by_code: Dict[str, Tuple[str, ...]]
+    # insertion position of each code, used to keep results in store order
+    positions: Dict[str, int]
+    # result row per code, built once and shared by every search
+    rows: Dict[str, TermRow]
+    # label token -> codes, for suggest's token-overlap scoring
+    tokens: Dict[str, List[str]]
+    # difflib candidates for the fuzzy fallbacks (the name_to_namaste keys), by length
+    choices: List[str]
+    choice_lengths: List[int]
+    # (query, n) -> difflib matches, LRU; dropped together with the index
+    fuzzy: OrderedDict[Tuple[str, int], List[str]]
+
+
+def _index_term(
+    term: Term,
+    namaste: Dict[str, Term],
+    name_map: Dict[str, str],
+    icd_map: Dict[str, List[str]]
+) -> int:
+    """
+    Add term to the code, name/synonym and ICD reverse maps
+    Returns the change in the number of dual-coded terms
+    """
+    previous = namaste.get(term.code)
+    delta = bool(term.icd11_tm2_codes) - bool(previous is not None and previous.icd11_tm2_codes)
+    namaste[term.code] = term
+    # map names/synonyms to code
+    name_map[term.label_lc] = term.code
+    for s in term.synonyms_lc:
+        name_map.setdefault(s, term.code)
+    # ICD codes are normalized (no 'ICD-11:' prefix) at ingest
+    for icd in term.icd11_tm2_codes:
+        codes = icd_map.setdefault(icd, [])
+        if term.code not in codes:
+            codes.append(term.code)
+    return delta
 
 
 class TerminologyStore:
+    fuzzy_cache_size = 512
+    # below this many terms suggest just scores every term
+    suggest_scan_limit = 64
+
     def __init__(self) -> None:
         self.namaste: Dict[str, Term] = {}
         self.icd_to_namaste: Dict[str, List[str]] = {}
         self.name_to_namaste: Dict[str, str] = {}
+        # bumped on every mutation so derived views (FHIR payloads) can be cached
+        self.version = 0
+        # running count of terms carrying at least one ICD-11 code
+        self.dual_coded = 0
+        self._search_index: _SearchIndex | None = None
+        self._fuzzy_lock = threading.Lock()
 
     def clear(self) -> None:
         self.namaste.clear()
         self.icd_to_namaste.clear()
         self.name_to_namaste.clear()
+        self.dual_coded = 0
+        self.version += 1
 
     def add_term(self, term: Term) -> None:
-        self.namaste[term.code] = term
-        # map names/synonyms to code
-        self.name_to_namaste[term.label.lower()] = term.code
-        for s in term.synonyms:
-            self.name_to_namaste.setdefault(s.lower(), term.code)
-        for icd in term.icd11_tm2_codes:
-            code_only = icd.replace('ICD-11:', '').strip()
-            self.icd_to_namaste.setdefault(icd, []).append(term.code)
-            self.icd_to_namaste.setdefault(code_only, []).append(term.code)
-
-    def search(self, query: str) -> Dict[str, Any]:
-        q = query.lower().strip()
-        exact: List[Dict[str, Any]] = []
-        partial: List[Dict[str, Any]] = []
-        # collect name universe for fuzzy
-        name_to_code: List[Tuple[str, str]] = []
+        self.version += 1
+        self.dual_coded += _index_term(term, self.namaste, self.name_to_namaste, self.icd_to_namaste)
+
+    def replace_terms(self, terms: List[Term]) -> None:
+        """
+        Swap in a whole catalog at once (the ingest path)
+        The maps are built off to the side, so readers see the old catalog or the
+        new one but never a half-loaded store
+        """
+        namaste: Dict[str, Term] = {}
+        icd_to_namaste: Dict[str, List[str]] = {}
+        name_to_namaste: Dict[str, str] = {}
+        dual_coded = 0
+        for term in terms:
+            dual_coded += _index_term(term, namaste, name_to_namaste, icd_to_namaste)
+        self.namaste = namaste
+        self.icd_to_namaste = icd_to_namaste
+        self.name_to_namaste = name_to_namaste
+        self.dual_coded = dual_coded
+        self.version += 1
+
+    def is_loaded(self) -> bool:
+        return bool(self.namaste)
+
+    def namaste_codes_for_icd(self, code: str) -> List[str]:
+        # reverse index lookup; accepts the code with or without the 'ICD-11:' prefix
+        return self.icd_to_namaste.get(code.removeprefix('ICD-11:').strip(), [])
+
+    def _get_search_index(self) -> _SearchIndex:
+        # rebuilt lazily on the first search after a mutation
+        index = self._search_index
+        if index is not None and index.version == self.version:
+            return index
+        version = self.version
+        exact: Dict[str, List[str]] = {}
+        pairs: List[Tuple[str, str]] = []
+        tokens: Dict[str, List[str]] = {}
         for term in self.namaste.values():
-            entry = {
-                'code': term.code,
-                'label': term.label,
-                'synonyms': term.synonyms,
-                'icd11_tm2_codes': term.icd11_tm2_codes,
-            }
-            if term.label.lower() == q or q in [s.lower() for s in term.synonyms]:
-                exact.append(entry)
-            elif q in term.label.lower() or any(q in s.lower() for s in term.synonyms):
-                partial.append(entry)
-            name_to_code.append((term.label.lower(), term.code))
-            for s in term.synonyms:
-                name_to_code.append((s.lower(), term.code))
+            for name in {term.label_lc, *term.synonyms_lc}:
+                exact.setdefault(name, []).append(term.code)
+                pairs.extend((name[i:i + _SUFFIX_CAP], term.code) for i in range(len(name)))
+            for token in term.label_tokens:
+                tokens.setdefault(token, []).append(term.code)
+        pairs.sort()
+        choices = sorted(self.name_to_namaste, key=len)
+        index = _SearchIndex(
+            version=version,
+            exact=exact,
+            names=sorted(exact),
+            suffixes=[sfx for sfx, _ in pairs],
+            suffix_codes=[code for _, code in pairs],
+            names_by_code={code: (term.label_lc, *term.synonyms_lc) for code, term in self.namaste.items()},
+            positions={code: i for i, code in enumerate(self.namaste)},
+            rows={
+                code: TermRow(code, term.label, term.synonyms, term.icd11_tm2_codes)
+                for code, term in self.namaste.items()
+            },
+            tokens=tokens,
+            choices=choices,
+            choice_lengths=[len(c) for c in choices],
+            fuzzy=OrderedDict(),
+        )
+        self._search_index = index
+        return index
+
+    def _close_matches(self, index: _SearchIndex, q: str, n: int) -> List[str]:
+        # difflib is slow; repeated misspellings are answered from the cache
+        key = (q, n)
+        with self._fuzzy_lock:
+            matches = index.fuzzy.get(key)
+            if matches is not None:
+                index.fuzzy.move_to_end(key)
+                return matches
+        # ratio() <= 2*min(len)/(sum of lens), so only names in this length
+        # window can reach the cutoff (widened by one for float rounding)
+        c = _FUZZY_CUTOFF
+        lo = bisect_left(index.choice_lengths, len(q) * c / (2 - c) - 1)
+        hi = bisect_right(index.choice_lengths, len(q) * (2 - c) / c + 1, lo)
+        matches = difflib.get_close_matches(q, index.choices[lo:hi], n=n, cutoff=c)
+        with self._fuzzy_lock:
+            index.fuzzy[key] = matches
+            if len(index.fuzzy) > self.fuzzy_cache_size:
+                index.fuzzy.popitem(last=False)
+        return matches
+
+    @staticmethod
+    def _suffix_range(index: _SearchIndex, q: str) -> Tuple[int, int]:
+        # suffixes starting with q, or with its first _SUFFIX_CAP characters
+        key = q[:_SUFFIX_CAP]
+        lo = bisect_left(index.suffixes, key)
+        return lo, bisect_left(index.suffixes, key + _MAX_CHAR, lo)
+
+    def _substring_codes(self, index: _SearchIndex, q: str) -> set:
+        # codes of terms with q inside their label or a synonym
+        lo, hi = self._suffix_range(index, q)
+        codes = set(index.suffix_codes[lo:hi])
+        if len(q) > _SUFFIX_CAP:
+            codes = {c for c in codes if any(q in name for name in index.names_by_code[c])}
+        return codes
+
+    def search(self, query: str) -> Dict[str, List[TermRow]]:
+        q = query.lower().strip()
+        index = self._get_search_index()
+        exact_codes = set(index.exact.get(q, ()))
+        if q:
+            # names containing q are exactly the suffixes starting with q
+            matched = self._substring_codes(index, q)
+        else:
+            matched = set(self.namaste)
+        ordered = sorted(matched | exact_codes, key=index.positions.__getitem__)
+        exact = [index.rows[c] for c in ordered if c in exact_codes]
+        partial = [index.rows[c] for c in ordered if c not in exact_codes]
 
         if not exact and not partial and q:
-            # fuzzy fallback with difflib
-            choices = [n for n, _ in name_to_code]
-            matches = difflib.get_close_matches(q, choices, n=8, cutoff=0.6)
-            codes = {code for n, code in name_to_code if n in matches}
-            for c in codes:
-                t = self.namaste.get(c)
-                if not t:
-                    continue
-                partial.append({
-                    'code': t.code,
-                    'label': t.label,
-                    'synonyms': t.synonyms,
-                    'icd11_tm2_codes': t.icd11_tm2_codes,
-                })
+            # fuzzy fallback with difflib over every label/synonym
+            matches = self._close_matches(index, q, 8)
+            codes = {code for m in matches for code in index.exact.get(m, ())}
+            for c in sorted(codes, key=index.positions.__getitem__):
+                partial.append(index.rows[c])
         return {'exact': exact, 'partial': partial}
 
     def translate(self, code: str, system: str) -> Dict[str, Any]:
@@ -82,53 +251,80 @@ class TerminologyStore:
                 term = self.namaste.get(code_by_name) if code_by_name else None
             if not term:
                 # fuzzy by name/synonym
-                choices = list(self.name_to_namaste.keys())
-                m = difflib.get_close_matches(code.lower(), choices, n=1, cutoff=0.6)
+                m = self._close_matches(self._get_search_index(), code.lower(), 1)
                 if m:
                     term = self.namaste.get(self.name_to_namaste[m[0]])
             if not term:
                 return {'matches': []}
             return {'matches': [{'system': 'icd11', 'code': c} for c in term.icd11_tm2_codes]}
         else:
-            icd_norm = code.replace('ICD-11:', '').strip()
-            nam_codes = self.icd_to_namaste.get(code, []) or self.icd_to_namaste.get(icd_norm, [])
+            nam_codes = self.namaste_codes_for_icd(code)
             return {'matches': [{'system': 'namaste', 'code': c} for c in nam_codes]}
 
+    def _suggest_candidates(self, q: str, q_tokens: set) -> List[Term]:
+        # Only terms with q inside a name or sharing a label token can score,
+        # so large stores are narrowed through the search index first
+        if not q or len(self.namaste) < self.suggest_scan_limit:
+            return list(self.namaste.values())
+        index = self._get_search_index()
+        # for queries over the cap this is a superset; scoring re-checks every candidate
+        lo, hi = self._suffix_range(index, q)
+        if hi - lo >= len(self.namaste):
+            # broad query; narrowing would cost more than it saves
+            return list(self.namaste.values())
+        codes = set(index.suffix_codes[lo:hi])
+        for token in q_tokens:
+            codes.update(index.tokens.get(token, ()))
+        return [self.namaste[c] for c in sorted(codes, key=index.positions.__getitem__)]
+
+    def _prefix_codes(self, q: str) -> set:
+        # codes of terms whose label or a synonym starts with q
+        index = self._get_search_index()
+        lo = bisect_left(index.names, q)
+        hi = bisect_left(index.names, q + _MAX_CHAR, lo)
+        return {code for name in index.names[lo:hi] for code in index.exact[name]}
+
     def suggest_with_confidence(self, text: str) -> Dict[str, Any]:
         # Lightweight heuristic confidence scoring for hackathon
         q = text.lower().strip()
-        suggestions: List[Dict[str, Any]] = []
-        for term in self.namaste.values():
-            base = term.label.lower()
-            syns = [s.lower() for s in term.synonyms]
+        q_tokens = set(q.split())
+        prefix_codes = self._prefix_codes(q)
+        # score first and build result dicts only for the terms that are kept
+        scored: List[Tuple[int, Term]] = []
+        prefix_score = 92 if len(q) == 1 else 96
+        for term in self._suggest_candidates(q, q_tokens):
+            base = term.label_lc
+            syns = term.synonyms_lc
             score = 0
             # High priority: prefix matches (great for single-letter queries)
-            if base.startswith(q) or any(s.startswith(q) for s in syns):
-                score = 92 if len(q) == 1 else 96
+            if term.code in prefix_codes:
+                score = prefix_score
             elif q == base or q in syns:
                 score = 95
             elif q in base:
-                score = max(score, 80)
+                score = 80
             else:
                 # token overlap heuristic
-                q_tokens = set(q.split())
-                t_tokens = set(base.split())
-                overlap = len(q_tokens & t_tokens)
+                overlap = len(q_tokens & term.label_tokens)
                 if overlap:
-                    score = max(score, 60 + 10 * min(overlap, 3))
+                    score = 60 + 10 * min(overlap, 3)
             if score > 0:
-                suggestions.append({
-                    'namaste_code': term.code,
-                    'label': term.label,
-                    'icd11_candidates': term.icd11_tm2_codes,
-                    'confidence': min(score, 99)
-                })
+                scored.append((score, term))
         # If very short query (<=2), prioritize prefix alphabetical ordering
+        # nsmallest/nlargest match a stable sort + slice without sorting everything
         if len(q) <= 2:
-            suggestions.sort(key=lambda x: (-(x['confidence']), x['label']))
-            return {'suggestions': suggestions[:50]}
-        suggestions.sort(key=lambda x: x['confidence'], reverse=True)
-        return {'suggestions': suggestions[:20]}
+            top = heapq.nsmallest(50, scored, key=lambda x: (-x[0], x[1].label))
+        else:
+            top = heapq.nlargest(20, scored, key=lambda x: x[0])
+        return {'suggestions': [
+            {
+                'namaste_code': term.code,
+                'label': term.label,
+                'icd11_candidates': term.icd11_tm2_codes,
+                'confidence': min(score, 99)
+            }
+            for score, term in top
+        ]}
 
 
 terminology_store = TerminologyStore()
@@ -4,29 +4,77 @@ Implements OAuth2 client credentials flow and data synchronization
 """
 import httpx
 import asyncio
-from typing import Dict, List, Any, Optional
-from datetime import datetime, timedelta
-import json
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
+import sqlite3
+import threading
+import time
+import orjson
 from pathlib import Path
 
 
+# Catalogs larger than this are filtered off the event loop
+FILTER_OFFLOAD_THRESHOLD = 10_000
+
+
 class WHOICD11Client:
+    # Entities kept in memory in front of the sqlite cache
+    mem_cache_size = 1024
+    # Seconds before the TM2 catalog is fetched again (same policy as the /translate titles)
+    tm2_ttl = 3600.0
+    
     def __init__(self, client_id: str = "demo_client", client_secret: str = "demo_secret"):
         self.client_id = client_id
         self.client_secret = client_secret
         self.base_url = "https://id.who.int"
         self.token_url = "https://icdaccessmanagement.who.int/connect/token"
         self.access_token: Optional[str] = None
-        self.token_expires: Optional[datetime] = None
+        # time.monotonic() deadline, immune to wall-clock changes
+        self.token_expires: Optional[float] = None
+        # Only one token request in flight; concurrent callers wait for it
+        self._token_lock = asyncio.Lock()
         self.cache_dir = Path("/tmp/cache")
         self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Entity cache: in-memory LRU backed by a single sqlite file
+        self._mem: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        # TM2 catalog as parallel arrays: raw entities plus lowercased title and
+        # joined synonyms, so queries only run substring tests. Swapped as one
+        # tuple and refreshed after tm2_ttl or invalidate_tm2()
+        self._tm2: Optional[Tuple[List[Dict[str, Any]], List[str], List[str]]] = None
+        self._tm2_fetched: Optional[float] = None
+        self._tm2_lock = asyncio.Lock()
+        # Shared connection pool, created on first use and closed by aclose()
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    async def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared HTTP client so connections are kept alive between calls"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=httpx.Limits(max_keepalive_connections=20))
+        return self._client
+    
+    async def aclose(self) -> None:
+        """Close the shared HTTP client and the entity cache database"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
     
     async def get_access_token(self) -> str:
         """Get OAuth2 access token using client credentials"""
-        if self.access_token and self.token_expires and datetime.now() < self.token_expires:
+        if self._token_valid():
             return self.access_token
         
-        async with httpx.AsyncClient() as client:
+        async with self._token_lock:
+            # Another caller may have refreshed the token while we waited
+            if self._token_valid():
+                return self.access_token
+            
+            client = await self._get_client()
             data = {
                 "grant_type": "client_credentials",
                 "client_id": self.client_id,
@@ -39,42 +87,45 @@ class WHOICD11Client:
             
             self.access_token = token_data["access_token"]
             expires_in = token_data.get("expires_in", 3600)
-            self.token_expires = datetime.now() + timedelta(seconds=expires_in - 60)
+            self.token_expires = time.monotonic() + expires_in - 60
             
             return self.access_token
     
+    def _token_valid(self) -> bool:
+        return bool(self.access_token and self.token_expires and time.monotonic() < self.token_expires)
+    
     async def search_entities(self, query: str, linearization: str = "mms") -> List[Dict[str, Any]]:
         """Search ICD-11 entities"""
         token = await self.get_access_token()
         headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
         
-        async with httpx.AsyncClient() as client:
-            params = {
-                "q": query,
-                "linearization": linearization,
-                "useFlexisearch": "false",
-                "flatResults": "true"
-            }
-            response = await client.get(
-                f"{self.base_url}/icd/release/11/{linearization}/mms/search",
-                headers=headers,
-                params=params
-            )
-            response.raise_for_status()
-            return response.json()
+        client = await self._get_client()
+        params = {
+            "q": query,
+            "linearization": linearization,
+            "useFlexisearch": "false",
+            "flatResults": "true"
+        }
+        response = await client.get(
+            f"{self.base_url}/icd/release/11/{linearization}/mms/search",
+            headers=headers,
+            params=params
+        )
+        response.raise_for_status()
+        return response.json()
     
     async def get_entity(self, entity_id: str, linearization: str = "mms") -> Dict[str, Any]:
         """Get specific ICD-11 entity details"""
         token = await self.get_access_token()
         headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/icd/release/11/{linearization}/mms/{entity_id}",
-                headers=headers
-            )
-            response.raise_for_status()
-            return response.json()
+        client = await self._get_client()
+        response = await client.get(
+            f"{self.base_url}/icd/release/11/{linearization}/mms/{entity_id}",
+            headers=headers
+        )
+        response.raise_for_status()
+        return response.json()
     
     async def get_tm2_entities(self) -> List[Dict[str, Any]]:
         """Get all TM2 (Traditional Medicine Module 2) entities"""
@@ -130,6 +181,47 @@ class WHOICD11Client:
             }
         ]
     
+    def invalidate_tm2(self) -> None:
+        """Drop the cached TM2 catalog so the next search fetches it again"""
+        self._tm2 = None
+        self._tm2_fetched = None
+    
+    def _tm2_fresh(self) -> bool:
+        return (
+            self._tm2 is not None and self._tm2_fetched is not None
+            and time.monotonic() - self._tm2_fetched < self.tm2_ttl
+        )
+    
+    async def _get_tm2_catalog(self) -> Tuple[List[Dict[str, Any]], List[str], List[str]]:
+        """Cached TM2 catalog arrays, fetched again once they are older than tm2_ttl"""
+        if not self._tm2_fresh():
+            async with self._tm2_lock:
+                if not self._tm2_fresh():
+                    entities = await self.get_tm2_entities()
+                    self._tm2 = (
+                        entities,
+                        [e.get("title", "").lower() for e in entities],
+                        [" ".join(e.get("synonyms", [])).lower() for e in entities]
+                    )
+                    self._tm2_fetched = time.monotonic()
+        return self._tm2
+    
+    async def search_tm2_entities(self, query: str) -> List[Dict[str, Any]]:
+        """Filter TM2 entities whose title or synonyms contain the query"""
+        entities, titles, synonyms = await self._get_tm2_catalog()
+        q = query.lower()
+        if len(entities) > FILTER_OFFLOAD_THRESHOLD:
+            loop = asyncio.get_running_loop()
+            indices = await loop.run_in_executor(None, self._match_tm2, q, titles, synonyms)
+        else:
+            indices = self._match_tm2(q, titles, synonyms)
+        return [entities[i] for i in indices]
+    
+    @staticmethod
+    def _match_tm2(q: str, titles: List[str], synonyms: List[str]) -> List[int]:
+        """Indices of TM2 entities whose title or synonyms contain the lowercased query"""
+        return [i for i in range(len(titles)) if q in titles[i] or q in synonyms[i]]
+    
     async def get_biomedicine_entities(self, query: str = "") -> List[Dict[str, Any]]:
         """Get ICD-11 Biomedicine entities"""
         # For demo, return mock biomedicine data
@@ -152,19 +244,47 @@ class WHOICD11Client:
             }
         ]
     
-    def cache_entity(self, entity_id: str, data: Dict[str, Any]) -> None:
+    async def cache_entity(self, entity_id: str, data: Dict[str, Any]) -> None:
         """Cache entity data locally"""
-        cache_file = self.cache_dir / f"{entity_id}.json"
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-    
-    def get_cached_entity(self, entity_id: str) -> Optional[Dict[str, Any]]:
-        """Get cached entity data"""
-        cache_file = self.cache_dir / f"{entity_id}.json"
-        if cache_file.exists():
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return None
+        self._remember(entity_id, data)
+        await asyncio.to_thread(self._db_put, entity_id, orjson.dumps(data))
+    
+    async def get_cached_entity(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        """Get cached entity data; the returned dict is shared and must not be mutated"""
+        data = self._mem.get(entity_id)
+        if data is not None:
+            self._mem.move_to_end(entity_id)
+            return data
+        blob = await asyncio.to_thread(self._db_get, entity_id)
+        if blob is None:
+            return None
+        data = orjson.loads(blob)
+        self._remember(entity_id, data)
+        return data
+    
+    def _remember(self, entity_id: str, data: Dict[str, Any]) -> None:
+        self._mem[entity_id] = data
+        self._mem.move_to_end(entity_id)
+        if len(self._mem) > self.mem_cache_size:
+            self._mem.popitem(last=False)
+    
+    def _get_db(self) -> sqlite3.Connection:
+        # Called with _db_lock held; the connection is shared by worker threads
+        if self._db is None:
+            db = sqlite3.connect(self.cache_dir / "icd.db", isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS entities (id TEXT PRIMARY KEY, blob BLOB NOT NULL)")
+            self._db = db
+        return self._db
+    
+    def _db_put(self, entity_id: str, blob: bytes) -> None:
+        with self._db_lock:
+            self._get_db().execute("INSERT OR REPLACE INTO entities (id, blob) VALUES (?, ?)", (entity_id, blob))
+    
+    def _db_get(self, entity_id: str) -> Optional[bytes]:
+        with self._db_lock:
+            row = self._get_db().execute("SELECT blob FROM entities WHERE id = ?", (entity_id,)).fetchone()
+        return row[0] if row else None
 
 
 # Global client instance
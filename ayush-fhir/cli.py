@@ -5,15 +5,18 @@ Provides command-line testing and demonstration capabilities
 """
 import asyncio
 import json
+import os
 import sys
+import threading
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Dict, Any, List
-import argparse
+from types import SimpleNamespace
+from typing import Callable, Dict, Any, List, Optional, Tuple
 
 # Add app directory to path
 sys.path.insert(0, str(Path(__file__).parent / "app"))
 
-from app.storage import terminology_store
+from app.storage import TermRow, terminology_store
 from app.ingest import ingest_csv_file
 from app.who_api import who_client
 from app.snomed_loinc import snomed_service, loinc_service
@@ -21,23 +24,110 @@ from app.fhir_resources import create_problem_list_entry
 from app.iso_22600 import check_resource_access
 
 
+DATA_PATH = Path(__file__).parent / "data" / "namaste_200.csv"
+# Commands that read the terminology store; only these are worth pre-warming
+DATA_COMMANDS = frozenset({"search", "translate", "suggest", "problem-list", "demo"})
+
+
+_SEP = "=" * 50
+
+# The CLI always checks as a treating doctor against the example resource
+_check_access_cli = partial(
+    check_resource_access,
+    subject_type="practitioner",
+    subject_roles=("doctor",),
+    resource_id="example-001",
+    purpose="TREATMENT"
+)
+
+
+def _write(lines: List[str]) -> None:
+    """Emit a block of output lines as one encoded write to the byte stream"""
+    text = "\n".join(lines) + "\n"
+    stream = sys.stdout
+    buffer = getattr(stream, "buffer", None)
+    if buffer is None:
+        # replaced stdout (e.g. a StringIO) has no byte layer
+        stream.write(text)
+        return
+    # every CLI line goes through here, so nothing is left queued in the text layer
+    buffer.write(text.encode(stream.encoding or "utf-8", stream.errors or "strict"))
+    if stream.line_buffering:
+        # interactive terminal: show each block as soon as it is ready
+        buffer.flush()
+
+
+def _term_lines(lines: List[str], items: List[TermRow]) -> None:
+    """Append the display lines for NAMASTE search results"""
+    for item in items:
+        lines.append(f"  • {item.code}: {item.label}")
+        if item.synonyms:
+            lines.append(f"    Synonyms: {', '.join(item.synonyms)}")
+        if item.icd11_tm2_codes:
+            lines.append(f"    ICD-11: {', '.join(item.icd11_tm2_codes)}")
+
+
+@lru_cache(maxsize=1)
+def _load_dataset(path: Path, mtime_ns: int, size: int) -> int:
+    """Ingest the dataset once per file version (mtime/size are the cache key)"""
+    return ingest_csv_file(path.read_bytes())
+
+
 class AyushFHIRCLI:
     """Command-line interface for Ayush FHIR Service"""
     
     def __init__(self):
         self.loaded = False
+        # One event loop for every async call, so the WHO client's pooled
+        # connections and cached TM2 catalog survive between commands
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._warmup: Optional[threading.Thread] = None
+    
+    def start_warmup(self) -> None:
+        """Ingest the dataset in a background thread while the command line is parsed"""
+        if self._warmup is None and DATA_PATH.exists():
+            self._warmup = threading.Thread(target=self._warm_dataset, daemon=True)
+            self._warmup.start()
+    
+    @staticmethod
+    def _warm_dataset() -> None:
+        try:
+            stat = DATA_PATH.stat()
+            _load_dataset(DATA_PATH, stat.st_mtime_ns, stat.st_size)
+        except Exception:
+            # load_data retries on the main thread and reports the error there
+            pass
+    
+    def run_async(self, coro):
+        """Run a coroutine on the CLI's shared event loop"""
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coro)
+    
+    def close(self) -> None:
+        """Release the WHO client and the event loop"""
+        if self._loop is not None:
+            self._loop.run_until_complete(who_client.aclose())
+            self._loop.run_until_complete(self._loop.shutdown_default_executor())
+            self._loop.close()
+            self._loop = None
     
     def load_data(self):
         """Load default dataset"""
+        if self._warmup is not None:
+            self._warmup.join()
+            self._warmup = None
         if not self.loaded:
-            data_path = Path(__file__).parent / "data" / "namaste_200.csv"
-            if data_path.exists():
-                content = data_path.read_bytes()
-                count = ingest_csv_file(content)
-                print(f"✓ Loaded {count} NAMASTE terms")
+            if DATA_PATH.exists():
+                if not terminology_store.is_loaded():
+                    # store was cleared since the last load
+                    _load_dataset.cache_clear()
+                stat = DATA_PATH.stat()
+                count = _load_dataset(DATA_PATH, stat.st_mtime_ns, stat.st_size)
+                _write([f"✓ Loaded {count} NAMASTE terms"])
                 self.loaded = True
             else:
-                print("✗ Default dataset not found")
+                _write(["✗ Default dataset not found"])
                 sys.exit(1)
     
     def search_namaste(self, query: str) -> None:
@@ -45,173 +135,191 @@ class AyushFHIRCLI:
         self.load_data()
         results = terminology_store.search(query)
         
-        print(f"\n🔍 Search Results for '{query}':")
-        print("=" * 50)
+        lines = [f"\n🔍 Search Results for '{query}':", _SEP]
         
         if results['exact']:
-            print("\n📌 Exact Matches:")
-            for item in results['exact']:
-                print(f"  • {item['code']}: {item['label']}")
-                if item['synonyms']:
-                    print(f"    Synonyms: {', '.join(item['synonyms'])}")
-                if item['icd11_tm2_codes']:
-                    print(f"    ICD-11: {', '.join(item['icd11_tm2_codes'])}")
+            lines.append("\n📌 Exact Matches:")
+            _term_lines(lines, results['exact'])
         
         if results['partial']:
-            print("\n🔍 Partial Matches:")
-            for item in results['partial']:
-                print(f"  • {item['code']}: {item['label']}")
-                if item['synonyms']:
-                    print(f"    Synonyms: {', '.join(item['synonyms'])}")
-                if item['icd11_tm2_codes']:
-                    print(f"    ICD-11: {', '.join(item['icd11_tm2_codes'])}")
+            lines.append("\n🔍 Partial Matches:")
+            _term_lines(lines, results['partial'])
         
         if not results['exact'] and not results['partial']:
-            print("  No matches found")
+            lines.append("  No matches found")
+        _write(lines)
     
     def translate_term(self, code: str, system: str) -> None:
         """Translate between NAMASTE and ICD-11"""
         self.load_data()
         results = terminology_store.translate(code, system)
         
-        print(f"\n🔄 Translation: {code} ({system})")
-        print("=" * 50)
+        lines = [f"\n🔄 Translation: {code} ({system})", _SEP]
         
         if results['matches']:
             for match in results['matches']:
-                print(f"  → {match['system']}: {match['code']}")
+                lines.append(f"  → {match['system']}: {match['code']}")
         else:
-            print("  No translations found")
+            lines.append("  No translations found")
+        _write(lines)
     
     def suggest_ai(self, query: str) -> None:
         """AI-powered suggestions with confidence"""
         self.load_data()
         results = terminology_store.suggest_with_confidence(query)
         
-        print(f"\n🤖 AI Suggestions for '{query}':")
-        print("=" * 50)
+        lines = [f"\n🤖 AI Suggestions for '{query}':", _SEP]
         
         if results['suggestions']:
             for suggestion in results['suggestions']:
-                print(f"  • {suggestion['namaste_code']}: {suggestion['label']}")
-                print(f"    Confidence: {suggestion['confidence']}%")
+                lines.append(f"  • {suggestion['namaste_code']}: {suggestion['label']}")
+                lines.append(f"    Confidence: {suggestion['confidence']}%")
                 if suggestion['icd11_candidates']:
-                    print(f"    ICD-11: {', '.join(suggestion['icd11_candidates'])}")
+                    lines.append(f"    ICD-11: {', '.join(suggestion['icd11_candidates'])}")
         else:
-            print("  No suggestions found")
+            lines.append("  No suggestions found")
+        _write(lines)
+    
+    def who_tm2(self, query: str) -> None:
+        """Search WHO ICD-11 TM2 from synchronous code"""
+        self.run_async(self.search_who_tm2(query))
     
     async def search_who_tm2(self, query: str) -> None:
         """Search WHO ICD-11 TM2"""
-        print(f"\n🌍 WHO ICD-11 TM2 Search: '{query}'")
-        print("=" * 50)
+        _write(await self._who_tm2_lines(query))
+    
+    async def _who_tm2_lines(self, query: str) -> List[str]:
+        lines = [f"\n🌍 WHO ICD-11 TM2 Search: '{query}'", _SEP]
         
         try:
-            entities = await who_client.get_tm2_entities()
-            filtered = [
-                e for e in entities 
-                if query.lower() in e.get('title', '').lower() or 
-                   query.lower() in ' '.join(e.get('synonyms', [])).lower()
-            ]
+            # the client loads the TM2 catalog once and filters it on later calls
+            filtered = await who_client.search_tm2_entities(query)
             
             if filtered:
                 for entity in filtered:
-                    print(f"  • {entity['id']}: {entity['title']}")
-                    print(f"    Definition: {entity.get('definition', 'N/A')}")
+                    lines.append(f"  • {entity['id']}: {entity['title']}")
+                    lines.append(f"    Definition: {entity.get('definition', 'N/A')}")
                     if entity.get('synonyms'):
-                        print(f"    Synonyms: {', '.join(entity['synonyms'])}")
+                        lines.append(f"    Synonyms: {', '.join(entity['synonyms'])}")
             else:
-                print("  No TM2 entities found")
+                lines.append("  No TM2 entities found")
         except Exception as e:
-            print(f"  Error: {e}")
+            lines.append(f"  Error: {e}")
+        return lines
     
     def search_snomed(self, query: str) -> None:
         """Search SNOMED CT"""
-        print(f"\n🏥 SNOMED CT Search: '{query}'")
-        print("=" * 50)
+        _write(self._snomed_lines(query))
+    
+    def _snomed_lines(self, query: str) -> List[str]:
+        lines = [f"\n🏥 SNOMED CT Search: '{query}'", _SEP]
         
         concepts = snomed_service.search_concepts(query)
         if concepts:
             for concept in concepts:
-                print(f"  • {concept.code}: {concept.display}")
-                print(f"    System: {concept.system}")
-                print(f"    Category: {concept.category}")
+                lines.append(f"  • {concept.code}: {concept.display}")
+                lines.append(f"    System: {concept.system}")
+                lines.append(f"    Category: {concept.category}")
         else:
-            print("  No SNOMED concepts found")
+            lines.append("  No SNOMED concepts found")
+        return lines
     
     def search_loinc(self, query: str) -> None:
         """Search LOINC"""
-        print(f"\n🧪 LOINC Search: '{query}'")
-        print("=" * 50)
+        _write(self._loinc_lines(query))
+    
+    def _loinc_lines(self, query: str) -> List[str]:
+        lines = [f"\n🧪 LOINC Search: '{query}'", _SEP]
         
         codes = loinc_service.search_codes(query)
         if codes:
             for code in codes:
-                print(f"  • {code.code}: {code.display}")
-                print(f"    System: {code.system}")
-                print(f"    Category: {code.category}")
+                lines.append(f"  • {code.code}: {code.display}")
+                lines.append(f"    System: {code.system}")
+                lines.append(f"    Category: {code.category}")
         else:
-            print("  No LOINC codes found")
+            lines.append("  No LOINC codes found")
+        return lines
     
     def create_problem_list(self, namaste_code: str) -> None:
         """Create FHIR Problem List entry"""
         self.load_data()
         
-        print(f"\n📋 Creating Problem List Entry: {namaste_code}")
-        print("=" * 50)
+        lines = [f"\n📋 Creating Problem List Entry: {namaste_code}", _SEP]
         
         try:
             term = terminology_store.namaste.get(namaste_code)
             if not term:
-                print(f"  ✗ NAMASTE code {namaste_code} not found")
+                lines.append(f"  ✗ NAMASTE code {namaste_code} not found")
                 return
+            icd_codes = term.icd11_tm2_codes
             
             condition = create_problem_list_entry(
                 namaste_code=namaste_code,
-                icd11_codes=term.icd11_tm2_codes,
+                icd11_codes=icd_codes,
                 patient_id="patient-001",
                 practitioner_id="practitioner-001",
                 encounter_id="encounter-001"
             )
             
-            print("  ✓ FHIR Condition created:")
-            print(f"    ID: {condition['id']}")
-            print(f"    Status: {condition['clinicalStatus']['coding'][0]['display']}")
-            print(f"    Codings:")
+            lines.append("  ✓ FHIR Condition created:")
+            lines.append(f"    ID: {condition['id']}")
+            lines.append(f"    Status: {condition['clinicalStatus']['coding'][0]['display']}")
+            lines.append(f"    Codings:")
             for coding in condition['code']['coding']:
-                print(f"      • {coding['system']}: {coding['code']} - {coding['display']}")
+                lines.append(f"      • {coding['system']}: {coding['code']} - {coding['display']}")
             
-            print(f"\n  📊 Dual Coding Summary:")
-            print(f"    NAMASTE: {namaste_code} - {term.label}")
-            print(f"    ICD-11: {', '.join(term.icd11_tm2_codes)}")
+            lines.append(f"\n  📊 Dual Coding Summary:")
+            lines.append(f"    NAMASTE: {namaste_code} - {term.label}")
+            lines.append(f"    ICD-11: {', '.join(icd_codes)}")
             
         except Exception as e:
-            print(f"  ✗ Error: {e}")
+            lines.append(f"  ✗ Error: {e}")
+        finally:
+            _write(lines)
     
     def check_access(self, subject_id: str, action: str, resource_type: str) -> None:
         """Check access control"""
-        print(f"\n🔐 Access Control Check")
-        print("=" * 50)
-        
-        allowed, reason = check_resource_access(
+        allowed, reason = _check_access_cli(
             subject_id=subject_id,
-            subject_type="practitioner",
-            subject_roles=["doctor"],
             action=action,
-            resource_type=resource_type,
-            resource_id="example-001",
-            purpose="TREATMENT"
+            resource_type=resource_type
         )
         
-        print(f"  Subject: {subject_id}")
-        print(f"  Action: {action}")
-        print(f"  Resource: {resource_type}")
-        print(f"  Result: {'✓ ALLOWED' if allowed else '✗ DENIED'}")
-        print(f"  Reason: {reason}")
+        _write([
+            f"\n🔐 Access Control Check",
+            _SEP,
+            f"  Subject: {subject_id}",
+            f"  Action: {action}",
+            f"  Resource: {resource_type}",
+            f"  Result: {'✓ ALLOWED' if allowed else '✗ DENIED'}",
+            f"  Reason: {reason}",
+        ])
+    
+    async def _demo_lookups(self) -> List[List[str]]:
+        """Run the independent terminology lookups of the demo side by side"""
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(
+            self._who_tm2_lines("dyspepsia"),
+            loop.run_in_executor(None, self._snomed_lines, "stomach"),
+            loop.run_in_executor(None, self._loinc_lines, "glucose")
+        )
     
     def demo_workflow(self) -> None:
-        """Demonstrate complete workflow"""
-        print("\n🎯 Complete Ayush FHIR Workflow Demo")
-        print("=" * 60)
+        """Demonstrate complete workflow, flushing the output once at the end"""
+        stream = sys.stdout
+        line_buffering = getattr(stream, "line_buffering", False)
+        if line_buffering:
+            stream.reconfigure(line_buffering=False)
+        try:
+            self._demo_steps()
+        finally:
+            if line_buffering:
+                stream.reconfigure(line_buffering=True)
+            stream.flush()
+    
+    def _demo_steps(self) -> None:
+        _write(["\n🎯 Complete Ayush FHIR Workflow Demo", "=" * 60])
         
         # 1. Search for a term
         self.search_namaste("Amlapitta")
@@ -222,14 +330,9 @@ class AyushFHIRCLI:
         # 3. Translate
         self.translate_term("AY001", "namaste")
         
-        # 4. Search WHO TM2
-        asyncio.run(self.search_who_tm2("dyspepsia"))
-        
-        # 5. Search SNOMED
-        self.search_snomed("stomach")
-        
-        # 6. Search LOINC
-        self.search_loinc("glucose")
+        # 4-6. Search WHO TM2, SNOMED and LOINC concurrently; print in order
+        for lines in self.run_async(self._demo_lookups()):
+            _write(lines)
         
         # 7. Create Problem List
         self.create_problem_list("AY001")
@@ -237,79 +340,105 @@ class AyushFHIRCLI:
         # 8. Check Access
         self.check_access("doctor-001", "read", "Condition")
         
-        print("\n✅ Demo completed successfully!")
+        _write(["\n✅ Demo completed successfully!"])
 
 
-def main():
-    """Main CLI entry point"""
+# command -> (handler, required options passed to it positionally)
+HANDLERS: Dict[str, Tuple[Callable[..., None], Tuple[str, ...]]] = {
+    "search": (AyushFHIRCLI.search_namaste, ("query",)),
+    "translate": (AyushFHIRCLI.translate_term, ("code", "system")),
+    "suggest": (AyushFHIRCLI.suggest_ai, ("query",)),
+    "who-tm2": (AyushFHIRCLI.who_tm2, ("query",)),
+    "snomed": (AyushFHIRCLI.search_snomed, ("query",)),
+    "loinc": (AyushFHIRCLI.search_loinc, ("query",)),
+    "problem-list": (AyushFHIRCLI.create_problem_list, ("code",)),
+    "access": (AyushFHIRCLI.check_access, ("subject", "action", "resource")),
+    "demo": (AyushFHIRCLI.demo_workflow, ()),
+}
+
+
+def _describe_options(names: Tuple[str, ...]) -> str:
+    """"--a", "--a and --b" or "--a, --b, and --c" for error messages"""
+    flags = [f"--{name}" for name in names]
+    if len(flags) <= 2:
+        return " and ".join(flags)
+    return ", ".join(flags[:-1]) + ", and " + flags[-1]
+
+
+# option flag -> destination, for the fast command-line path
+_FLAGS: Dict[str, str] = {
+    "--query": "query", "-q": "query",
+    "--code": "code", "-c": "code",
+    "--system": "system", "-s": "system",
+    "--subject": "subject",
+    "--action": "action",
+    "--resource": "resource",
+}
+_SYSTEMS = ("namaste", "icd11")
+
+
+def _build_parser():
+    """Full argparse parser, used for --help, errors and unusual spellings"""
+    import argparse
     parser = argparse.ArgumentParser(description="Ayush FHIR Service CLI")
-    parser.add_argument("command", choices=[
-        "search", "translate", "suggest", "who-tm2", "snomed", "loinc", 
-        "problem-list", "access", "demo"
-    ], help="Command to execute")
+    parser.add_argument("command", choices=list(HANDLERS), help="Command to execute")
     parser.add_argument("--query", "-q", help="Search query")
     parser.add_argument("--code", "-c", help="Code to translate")
-    parser.add_argument("--system", "-s", choices=["namaste", "icd11"], 
+    parser.add_argument("--system", "-s", choices=list(_SYSTEMS), 
                        help="System for translation")
     parser.add_argument("--subject", help="Subject ID for access check")
     parser.add_argument("--action", help="Action for access check")
     parser.add_argument("--resource", help="Resource type for access check")
-    
-    args = parser.parse_args()
+    return parser
+
+
+def _fast_parse(argv: List[str]) -> Optional[SimpleNamespace]:
+    """
+    Parse the common "<command> --flag value ..." form without importing argparse
+    Returns None for anything else so argparse can handle it (and report errors)
+    """
+    if not argv or argv[0] not in HANDLERS or len(argv) % 2 == 0:
+        return None
+    opts: Dict[str, Optional[str]] = dict.fromkeys(_FLAGS.values())
+    for flag, value in zip(argv[1::2], argv[2::2]):
+        dest = _FLAGS.get(flag)
+        if dest is None or value.startswith("-") or (dest == "system" and value not in _SYSTEMS):
+            return None
+        opts[dest] = value
+    return SimpleNamespace(command=argv[0], **opts)
+
+
+def parse_args(argv: List[str]) -> SimpleNamespace:
+    """Parse the command line, falling back to argparse when the fast path declines"""
+    args = _fast_parse(argv)
+    if args is None:
+        args = SimpleNamespace(**vars(_build_parser().parse_args(argv)))
+    return args
+
+
+def main():
+    """Main CLI entry point"""
     cli = AyushFHIRCLI()
-    
-    if args.command == "search":
-        if not args.query:
-            print("Error: --query required for search")
-            sys.exit(1)
-        cli.search_namaste(args.query)
-    
-    elif args.command == "translate":
-        if not args.code or not args.system:
-            print("Error: --code and --system required for translate")
-            sys.exit(1)
-        cli.translate_term(args.code, args.system)
-    
-    elif args.command == "suggest":
-        if not args.query:
-            print("Error: --query required for suggest")
-            sys.exit(1)
-        cli.suggest_ai(args.query)
-    
-    elif args.command == "who-tm2":
-        if not args.query:
-            print("Error: --query required for who-tm2")
-            sys.exit(1)
-        asyncio.run(cli.search_who_tm2(args.query))
-    
-    elif args.command == "snomed":
-        if not args.query:
-            print("Error: --query required for snomed")
-            sys.exit(1)
-        cli.search_snomed(args.query)
-    
-    elif args.command == "loinc":
-        if not args.query:
-            print("Error: --query required for loinc")
-            sys.exit(1)
-        cli.search_loinc(args.query)
-    
-    elif args.command == "problem-list":
-        if not args.code:
-            print("Error: --code required for problem-list")
-            sys.exit(1)
-        cli.create_problem_list(args.code)
-    
-    elif args.command == "access":
-        if not all([args.subject, args.action, args.resource]):
-            print("Error: --subject, --action, and --resource required for access")
-            sys.exit(1)
-        cli.check_access(args.subject, args.action, args.resource)
-    
-    elif args.command == "demo":
-        cli.demo_workflow()
+    # Opt-in: overlap the CSV ingest with argument parsing
+    # (only the subcommand position counts, so option values never trigger it)
+    if os.environ.get("AYUSH_EAGER_LOAD") == "1" and DATA_COMMANDS.intersection(sys.argv[1:2]):
+        cli.start_warmup()
+    args = parse_args(sys.argv[1:])
+    try:
+        run_command(cli, args)
+    finally:
+        cli.close()
+
+
+def run_command(cli: AyushFHIRCLI, args: SimpleNamespace) -> None:
+    """Validate the required options for a command and dispatch it"""
+    handler, required = HANDLERS[args.command]
+    values = [getattr(args, name) for name in required]
+    if not all(values):
+        _write([f"Error: {_describe_options(required)} required for {args.command}"])
+        sys.exit(1)
+    handler(cli, *values)
 
 
 if __name__ == "__main__":
     main()
-